@@ -1,12 +1,19 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
 import os
-from time import strftime
 
 from config import config
+from . import encoding, log
+from .cache import ResponseCache
+from .http_client import HttpClient
+from .images import image_pool
+from .metrics import metrics
+from .profiler import slow_query_profiler
 
 
 db = SQLAlchemy()
+response_cache = ResponseCache()
+http_client = HttpClient()
 
 
 def create_app(config_name):
@@ -14,12 +21,18 @@ def create_app(config_name):
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
 
+    log.init_app(app)
     db.init_app(app)
+    response_cache.init_app(app)
+    encoding.init_app(app)
+    http_client.init_app(app)
+    image_pool.init_app(app)
+    metrics.init_app(app)
+    slow_query_profiler.init_app(app)
 
     @app.after_request
     def after_request(response):
-        timestamp = strftime('[%Y-%b-%d %H:%M]')
-        app.logger.info('%s %s %s %s %s %s', timestamp, request.remote_addr, request.method, request.scheme, request.full_path, response.status)
+        log.log_access(response)
         return response
 
     from .api import api as api_blueprint
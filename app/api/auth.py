@@ -1,40 +1,119 @@
-from collections import defaultdict
+import logging
+import threading
 import time
 
 import requests
 from flask import current_app
 import jwt
 
+from . import api
+from .. import http_client
 
-cache = defaultdict(str)
 
+logger = logging.getLogger(__name__)
 
-def _get_access_token():
-    res = requests.post(
-      f"https://{current_app.config['AUTH0_API_DOMAIN']}/oauth/token",
-      data={
-        'grant_type': "client_credentials",
-        'client_id': current_app.config["AUTH0_API_CLIENT_ID"],
-        'client_secret': current_app.config["AUTH0_API_CLIENT_SECRET"],
-        'audience': current_app.config["AUTH0_API_AUDIENCE"]
-      }
-    )
-    res.raise_for_status()
-    access_token = res.json().get("access_token")
-    return access_token
+# seconds to wait before retrying a failed background refresh
+REFRESH_RETRY_DELAY = 10
 
 
-def get_access_token():
-    access_token = cache.get("access_token")
-    if access_token:
+class _Refresh:
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class TokenManager:
+    """Auth0 management API token shared by the greenlets of a worker.
+
+    The token's expiry is parsed once, when the token is fetched. Callers
+    get the cached token until ``refresh_ahead`` seconds before it expires.
+    The first caller after that starts a refresh in the background and
+    everyone keeps using the current token meanwhile. Callers only wait when
+    there is no valid token, and concurrent callers then wait on the same
+    request to Auth0.
+    """
+
+    def __init__(self, http, token_url, credentials, refresh_ahead=300, clock=time.time):
+        self.http = http
+        self.token_url = token_url
+        self.credentials = credentials
+        self.refresh_ahead = refresh_ahead
+        self.clock = clock
+        self.token = None
+        self.expires_at = 0
+        self._retry_at = 0
+        self._refresh = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = self.clock()
+        if self.token and now < self.expires_at - self.refresh_ahead:
+            return self.token
+        if self.token and now < self.expires_at:
+            if now >= self._retry_at:
+                self._start_refresh(background=True)
+            return self.token
+        refresh = self._start_refresh(background=False)
+        refresh.done.wait()
+        if refresh.error:
+            raise refresh.error
+        return self.token
+
+    def _start_refresh(self, background):
+        with self._lock:
+            refresh = self._refresh
+            if refresh is not None:
+                return refresh
+            refresh = self._refresh = _Refresh()
+        if background:
+            threading.Thread(target=self._run_refresh, args=(refresh,), daemon=True).start()
+        else:
+            self._run_refresh(refresh)
+        return refresh
+
+    def _run_refresh(self, refresh):
+        try:
+            self.token, self.expires_at = self._fetch()
+            logger.info("Fetched a new Auth0 access token")
+        except (requests.RequestException, jwt.PyJWTError, ValueError, KeyError) as e:
+            logger.error(f"Fetching an Auth0 access token failed: {e}")
+            refresh.error = e if isinstance(e, requests.RequestException) \
+                else requests.RequestException(f"Invalid token response: {e}")
+            self._retry_at = self.clock() + REFRESH_RETRY_DELAY
+        finally:
+            with self._lock:
+                self._refresh = None
+            refresh.done.set()
+
+    def _fetch(self):
+        # fetching a client credentials token has no side effect
+        res = self.http.post(
+          self.token_url,
+          data={
+            'grant_type': "client_credentials",
+            **self.credentials
+          },
+          retry=True
+        )
+        res.raise_for_status()
+        access_token = res.json()["access_token"]
         claims = jwt.decode(access_token, options={"verify_signature": False})
-        current_time = time.time()
-        if current_time > claims["exp"]:
-            current_app.logger.info("Access token has expired")
-            current_app.logger.info("Getting a new access token")
-            access_token = _get_access_token()
-    else:
-        current_app.logger.info("Access token is not in cache. Getting a new one")
-        access_token = _get_access_token()
-    cache["access_token"] = access_token
-    return access_token
\ No newline at end of file
+        return access_token, claims["exp"]
+
+
+@api.record_once
+def init_app(state):
+    app = state.app
+    app.extensions["auth0_token_manager"] = TokenManager(
+        http_client,
+        app.config["AUTH0_TOKEN_URL"],
+        {
+          'client_id': app.config["AUTH0_API_CLIENT_ID"],
+          'client_secret': app.config["AUTH0_API_CLIENT_SECRET"],
+          'audience': app.config["AUTH0_API_AUDIENCE"]
+        },
+        refresh_ahead=app.config["AUTH0_TOKEN_REFRESH_AHEAD"])
+
+
+def get_access_token():
+    return current_app.extensions["auth0_token_manager"].get()
@@ -0,0 +1,84 @@
+from functools import wraps
+import time
+
+from flask import current_app, g, make_response, request
+
+from . import api
+from ..encoding import jsonify
+from .. import response_cache
+from ..search import suggestion_cache
+
+
+def listing_tag(category=None):
+    if not category or category == "All":
+        category = "All"
+    return f"listing:{category}"
+
+
+def post_tag(id):
+    return f"post:{id}"
+
+
+def _listing_cache_key():
+    if "cursor" in request.args:
+        return None
+    page = request.args.get("page", 1, type=int)
+    if page > current_app.config["RESPONSE_CACHE_MAX_PAGE"]:
+        return None
+    category = request.args.get("category") or "All"
+    term = " ".join(request.args.get("term", "").lower().split())
+    include = ",".join(sorted(set(request.args.get("include", "").split(",")) - {""}))
+    return f"{request.endpoint}|{category}|{term}|{page}|{include}"
+
+
+def cached_listing(view):
+    """Serve the first pages of a post listing from the response cache.
+
+    The view tags what it rendered with ``tag_listing`` so writes can drop
+    exactly the pages they affect.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = _listing_cache_key() if response_cache.enabled else None
+        if key is None:
+            return view(*args, **kwargs)
+        body = response_cache.get(key)
+        if body is not None:
+            return current_app.response_class(body, mimetype="application/json")
+        # taken before the view reads anything, so a write landing while it
+        # renders invalidates the page
+        since = time.time_ns()
+        response = make_response(view(*args, **kwargs))
+        tags = g.get("response_cache_tags")
+        if response.status_code == 200 and tags:
+            response_cache.set(key, response.get_data(), tags, since=since)
+        return response
+    return wrapper
+
+
+def tag_listing(payload, category=None):
+    g.response_cache_tags = [listing_tag(category)] + \
+        [post_tag(post["id"]) for post in payload["posts"]]
+
+
+def invalidate_post(id):
+    """Drop cached pages showing the post, e.g. after a vote or comment."""
+    response_cache.invalidate(post_tag(id))
+
+
+def invalidate_listings(*categories):
+    """Drop cached pages whose membership changed, e.g. after a post is
+    created or deleted in one of ``categories``."""
+    response_cache.invalidate(listing_tag(), *[listing_tag(c) for c in categories])
+
+
+@api.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify({
+        "responses": response_cache.stats(),
+        "suggestions": {
+            "hits": suggestion_cache.hits,
+            "misses": suggestion_cache.misses
+        },
+        "profiles": current_app.extensions["profile_cache"].stats()
+    })
@@ -1,17 +1,22 @@
-from flask import current_app, jsonify
+from flask import current_app
 from sqlalchemy.exc import SQLAlchemyError
 
 from . import api
-from ..models import Category
+from ..encoding import jsonify
+from ..models import category_registry
+from .conditional import conditional_response
 from .errors import internal_error
 
 
 @api.route("/categories", methods=["GET"])
 def get_categories():
     current_app.logger.info("Retrieving all categories")
+
+    def build():
+      return jsonify({"categories": category_registry.names()})
+
     try:
-      categories = Category.query.with_entities(Category.name).all()
+      return conditional_response(build, category_registry.etag(), max_age=3600)
     except SQLAlchemyError as e:
       current_app.logger.error(e)
       return internal_error("Encounter unexpected error")
-    return jsonify({"categories": [c[0] for c in categories]})
\ No newline at end of file
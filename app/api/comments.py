@@ -1,12 +1,16 @@
-from flask import request, jsonify, url_for, current_app
+from flask import request, url_for, current_app
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import and_
 from datetime import datetime
 
 from . import api
+from ..encoding import jsonify
 from ..models import Post, Comment
 from .. import db
-from .errors import bad_request, forbidden, internal_error
+from .caching import invalidate_post
+from .conditional import conditional_response, timestamp_tag
+from .errors import bad_request, forbidden, not_found, internal_error
+from .pagination import decode_cursor, keyset_page, InvalidCursor
 from .validations import CreateCommentInput
 
 
@@ -14,26 +18,47 @@ from .validations import CreateCommentInput
 def get_post_comments(id):
     current_app.logger.info(f"Retrieving comments for post {id}")
     try:
-        post = Post.query.get_or_404(id)
+        post = db.session.query(Post.updated_time, Post.comment_count) \
+            .filter_by(id=id) \
+            .first()
+        if not post:
+            return not_found("Post is not found")
+
+        limit = request.args.get('offset', None, type=int)
+        if not limit:
+            limit = current_app.config["INITIAL_COMMENTS_PER_POST"]
+        limit = min(limit, current_app.config["COMMENTS_PER_PAGE"])
         start_comment = request.args.get('start_comment', None, type=int)
-        offset = request.args.get('offset', None, type=int)
-        if not offset:
-            offset = current_app.config["INITIAL_COMMENTS_PER_POST"]
-        if not start_comment:
-            comments = Comment.query.filter_by(post_id=id) \
-                .order_by(Comment.created_time.desc()) \
-                .limit(offset) \
-                .all()
-        else:
-            comments = Comment.query.filter(and_(Comment.post_id==id, Comment.id <= start_comment)) \
-                .order_by(Comment.created_time.desc()) \
-                .limit(offset) \
-                .all()
-        count = Comment.query.filter_by(post_id=id).count()
-        return jsonify({
-            'comments': [comment.to_json() for comment in comments],
-            'count': count
-        })
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                decode_cursor(cursor)
+            except InvalidCursor as e:
+                return bad_request(str(e))
+
+        def build():
+            if start_comment:
+                # legacy paging by comment id, kept for older clients
+                comments = Comment.query.filter(and_(Comment.post_id==id, Comment.id <= start_comment)) \
+                    .order_by(Comment.id.desc()) \
+                    .limit(limit) \
+                    .all()
+                next_cursor = None
+            else:
+                comments, next_cursor = keyset_page(
+                    Comment.query.filter_by(post_id=id),
+                    Comment.created_time, Comment.id,
+                    cursor, limit)
+            return jsonify({
+                'comments': [comment.to_json() for comment in comments],
+                'count': post.comment_count,
+                'next_cursor': next_cursor
+            })
+
+        return conditional_response(
+            build,
+            timestamp_tag("comments", id, post.updated_time),
+            last_modified=post.updated_time)
     except SQLAlchemyError as e:
         current_app.logger.error(e)
         db.session.rollback()
@@ -56,11 +81,14 @@ def new_post_comments(id):
         comment.author = author
         comment.post = post
         db.session.add(comment)
+        Post.query.filter_by(id=id) \
+            .update({Post.comment_count: Post.comment_count + 1}, synchronize_session=False)
         db.session.commit()
     except SQLAlchemyError as e:
         current_app.logger.error(e)
         db.session.rollback()
         return internal_error("Encounter unexpected error")
+    invalidate_post(id)
     return jsonify(comment.to_json()), 201
 
 
@@ -76,7 +104,11 @@ def edit_comment(post_id, comment_id):
             return forbidden(f"The comment is not for {post_id}")
         comment.text = request.json.get("text", comment.text)
         db.session.add(comment)
+        Post.query.filter_by(id=post_id) \
+            .update({Post.updated_time: datetime.utcnow()}, synchronize_session=False)
         db.session.commit()
+        # listings may embed the comment
+        invalidate_post(post_id)
         return jsonify(comment.to_json())
     except SQLAlchemyError as e:
         current_app.logger.error(e)
@@ -95,7 +127,10 @@ def delete_comment(post_id, comment_id):
         if comment.post_id != post_id:
             return forbidden(f"The comment is not for {post_id}")
         db.session.delete(comment)
+        Post.query.filter_by(id=post_id) \
+            .update({Post.comment_count: Post.comment_count - 1}, synchronize_session=False)
         db.session.commit()
+        invalidate_post(post_id)
         return "Deleted", 200
     except SQLAlchemyError as e:
         current_app.logger.error(e)
@@ -0,0 +1,38 @@
+from flask import current_app, make_response, request
+
+
+def _not_modified(etag, last_modified):
+    # If-None-Match wins over If-Modified-Since when both are sent
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def conditional_response(build, etag, last_modified=None, max_age=None):
+    """Answer a GET with 304 when the client's validators are still current.
+
+    ``etag`` and ``last_modified`` must be derived cheaply, without running
+    the query behind the response. ``build`` is only called when the client
+    needs a fresh body. Without ``max_age`` shared caches must revalidate on
+    every request.
+    """
+    if _not_modified(etag, last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(build())
+    if response.status_code in (200, 304):
+        response.set_etag(etag, weak=True)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.cache_control.public = True
+        if max_age is None:
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.max_age = max_age
+    return response
+
+
+def timestamp_tag(prefix, id, timestamp):
+    return f"{prefix}-{id}-{timestamp.strftime('%Y%m%d%H%M%S%f')}"
@@ -1,6 +1,8 @@
-from flask import current_app, jsonify
+from flask import current_app
 
 from . import api
+from ..encoding import jsonify
+from ..images import ImagePoolBroken, ImagePoolBusy, ImageTimeout
 
 
 def bad_request(message):
@@ -24,8 +26,38 @@ def not_found(message):
     return response
 
 
+def service_unavailable(message):
+    current_app.logger.warning(f"Service unavailable: {message}")
+    response = jsonify({'error': 'service unavailable', 'message': message})
+    response.status_code = 503
+    response.headers["Retry-After"] = "5"
+    return response
+
+
+def gateway_timeout(message):
+    current_app.logger.warning(f"Gateway timeout: {message}")
+    response = jsonify({'error': 'gateway timeout', 'message': message})
+    response.status_code = 504
+    return response
+
+
 def internal_error(message):
     current_app.logger.error(f"Internal error: {message}")
     response = jsonify({'error': 'internal server error', 'message': message})
     response.status_code = 500
-    return response
\ No newline at end of file
+    return response
+
+
+@api.errorhandler(ImagePoolBusy)
+def image_pool_busy(e):
+    return service_unavailable("Too many images are being processed, try again later")
+
+
+@api.errorhandler(ImagePoolBroken)
+def image_pool_broken(e):
+    return service_unavailable("Image processing failed, try again later")
+
+
+@api.errorhandler(ImageTimeout)
+def image_timeout(e):
+    return gateway_timeout("Processing the image took too long")
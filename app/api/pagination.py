@@ -0,0 +1,118 @@
+import base64
+from datetime import datetime
+
+from flask import current_app, request
+
+from .. import db
+from ..models import Comment, Post
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_time, id):
+    raw = f"{created_time.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_time, id = raw.split("|")
+        return datetime.fromisoformat(created_time), int(id)
+    except (ValueError, UnicodeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def wants_count():
+    return request.args.get("count", "false").lower() == "true"
+
+
+def includes(name):
+    return name in request.args.get("include", "").split(",")
+
+
+def include_comments(posts):
+    """Embed the newest ``INITIAL_COMMENTS_PER_POST`` comments of every
+    serialized post, fetched for the whole page at once."""
+    if not posts:
+        return
+    comments = Comment.latest_for(
+        [post["id"] for post in posts],
+        current_app.config["INITIAL_COMMENTS_PER_POST"])
+    for post in posts:
+        post["comments"] = [comment.to_json() for comment in comments[post["id"]]]
+
+
+def keyset_page(query, created_time, id, cursor, limit):
+    """Return one page of ``query`` newest first and the cursor of the next.
+
+    ``created_time`` and ``id`` are the columns the page is ordered by and
+    should lead an index with the query's filter, so a page costs the same
+    whatever the position in the result. They need not belong to the
+    queried entity. The cursor is None on the last page.
+    """
+    if cursor:
+        after = decode_cursor(cursor)
+        query = query.filter(db.tuple_(created_time, id) < db.tuple_(*after))
+    # fetch one extra row to find out whether there is a next page
+    rows = query.add_columns(created_time, id) \
+        .order_by(created_time.desc(), id.desc()) \
+        .limit(limit + 1) \
+        .all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*rows[-1][-2:])
+    return [row[0] for row in rows], next_cursor
+
+
+def paginate_posts(query, rank=None, order_by=None):
+    """Paginate a post query and return the listing payload.
+
+    Without a ``cursor`` argument this is the classic ``page`` based
+    pagination with a total count, ordered by ``rank`` first when one is
+    given. Passing ``cursor`` (empty for the first page) switches to keyset
+    pagination on ``(created_time, id)``, which walks
+    ``ix_posts_created_time_id`` instead of skipping rows with OFFSET, and
+    only counts the rows when ``count=true`` is given. Cursor pages are
+    always ordered by recency. ``include=comments`` embeds the newest
+    comments of each post.
+
+    ``order_by`` replaces the ``(created_time, id)`` pair posts are ordered
+    and keyed by, e.g. to list posts by the time they were commented on.
+    """
+    per_page = current_app.config["POSTS_PER_PAGE"]
+    created_time, id = order_by or (Post.created_time, Post.id)
+    if "cursor" not in request.args:
+        page = request.args.get("page", 1, type=int)
+        order = [created_time.desc(), id.desc()]
+        if rank is not None:
+            order.insert(0, rank)
+        pagination = query.order_by(*order) \
+            .paginate(
+                page,
+                per_page=per_page,
+                error_out=False)
+        payload = {
+            "posts": Post.bulk_to_json(pagination.items),
+            "limit": per_page,
+            "count": pagination.total
+        }
+        if includes("comments"):
+            include_comments(payload["posts"])
+        return payload
+
+    posts, next_cursor = keyset_page(
+        query, created_time, id, request.args.get("cursor"), per_page)
+    payload = {
+        "posts": Post.bulk_to_json(posts),
+        "limit": per_page,
+        "next_cursor": next_cursor
+    }
+    if wants_count():
+        payload["count"] = query.order_by(None).count()
+    if includes("comments"):
+        include_comments(payload["posts"])
+    return payload
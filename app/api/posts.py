@@ -1,37 +1,45 @@
-from flask import jsonify, request, current_app, url_for
-from sqlalchemy import and_
+from flask import request, current_app, url_for, stream_with_context
 from sqlalchemy.exc import SQLAlchemyError
 
 from . import api
-from ..models import Post, Category
+from ..encoding import jsonify
+from ..models import Post, category_registry
 from .. import db
+from ..export import export_query, iter_ndjson, parse_date
+from ..search import search_query, suggest_titles, UnknownCategory
+from .caching import cached_listing, tag_listing, invalidate_post, invalidate_listings
+from .conditional import conditional_response, timestamp_tag
 from .errors import bad_request, forbidden, not_found, internal_error
+from .pagination import paginate_posts, InvalidCursor
 from .validations import CreatePostInput
 
 
 @api.route("/posts", methods=["GET"])
+@cached_listing
 def get_posts():
     current_app.logger.info("Retrieving posts")
-    page = request.args.get("page", 1, type=int)
-    pagination = Post.query.order_by(Post.created_time.desc()) \
-        .paginate(
-            page,
-            per_page=current_app.config["POSTS_PER_PAGE"],
-            error_out=False
-        )
-    posts = pagination.items
-    return jsonify({
-        "posts": [post.to_json() for post in posts],
-        "limit": current_app.config["POSTS_PER_PAGE"],
-        "count": pagination.total
-    })
+    try:
+        payload = paginate_posts(Post.query)
+    except InvalidCursor as e:
+        return bad_request(str(e))
+    tag_listing(payload)
+    return jsonify(payload)
 
 
 @api.route("/posts/<int:id>", methods=["GET"])
 def get_post(id):
     current_app.logger.info(f"Retrieving post by {id}")
-    post = Post.query.get_or_404(id)
-    return jsonify(post.to_json())
+
+    def build():
+        return jsonify(Post.query.get_or_404(id).to_json())
+
+    updated_time = db.session.query(Post.updated_time).filter_by(id=id).scalar()
+    if updated_time is None:
+        return build()
+    return conditional_response(
+        build,
+        timestamp_tag("post", id, updated_time),
+        last_modified=updated_time)
 
 
 @api.route("/posts", methods=["POST"])
@@ -53,6 +61,7 @@ def create_post():
         current_app.logger.error(e)
         db.session.rollback()
         return internal_error("Encounter unexpected error")
+    invalidate_listings(category_registry.name_for(post.category_id))
     return jsonify(post.to_json()), 201, \
         {'Location': url_for('api.get_post', id=post.id)}
 
@@ -65,6 +74,7 @@ def edit_post(id):
         post = Post.query.get_or_404(id)
         if editor != post.author:
             return forbidden(f"{editor} is not the post's owner")
+        old_category = category_registry.name_for(post.category_id)
         post.update_from_json(request.json)
         db.session.add(post)
         db.session.commit()
@@ -72,6 +82,9 @@ def edit_post(id):
         current_app.logger.error(r)
         db.session.rollback()
         return internal_error("Encounter unexpected error")
+    # an edit can change which searches and categories the post shows up in
+    invalidate_post(id)
+    invalidate_listings(old_category, category_registry.name_for(post.category_id))
     return jsonify(post.to_json())
 
 
@@ -83,8 +96,11 @@ def delete_post(id):
         editor = request.headers.get("username")
         if editor != post.author:
             return forbidden(f"{editor} is not the post's owner")
+        category = category_registry.name_for(post.category_id)
         db.session.delete(post)
         db.session.commit()
+        invalidate_post(id)
+        invalidate_listings(category)
         return "Deleted", 200
     except SQLAlchemyError as e:
         current_app.logger.error(e)
@@ -93,51 +109,54 @@ def delete_post(id):
 
 
 @api.route("/posts/search", methods=["GET"])
+@cached_listing
 def search_posts():
     current_app.logger.info("Searching for post")
-    page = request.args.get("page", 1, type=int)
     category = request.args.get("category", None, type=str)
     search_key = request.args.get("term", None, type=str)
-    if not category or category == "All":
-        if search_key:
-            pagination = Post.query.filter(Post.title.ilike(f"%{search_key}%")) \
-                .order_by(Post.created_time.desc()) \
-                .paginate(                
-                    page,
-                    per_page=current_app.config["POSTS_PER_PAGE"],
-                    error_out=False)
-        else:
-            pagination = Post.query.order_by(Post.created_time.desc()) \
-                .paginate(                
-                    page,
-                    per_page=current_app.config["POSTS_PER_PAGE"],
-                    error_out=False)
-    else:
-        if search_key:
-            pagination = Post.query.join(Category) \
-                .filter(
-                    and_(
-                        Post.title.ilike(f"%{search_key}%"), 
-                        Category.name == category)) \
-                .order_by(Post.created_time.desc()) \
-                .paginate(
-                    page,
-                    per_page=current_app.config["POSTS_PER_PAGE"],
-                    error_out=False)
-        else:
-            pagination = Post.query.join(Category) \
-                .filter(Category.name == category) \
-                .order_by(Post.created_time.desc()) \
-                .paginate(
-                    page,
-                    per_page=current_app.config["POSTS_PER_PAGE"],
-                    error_out=False)     
-    posts = pagination.items
-    return jsonify({
-        "posts": [post.to_json() for post in posts],
-        "limit": current_app.config["POSTS_PER_PAGE"],
-        "count": pagination.total
-    })
+    try:
+        query, rank = search_query(
+            Post.query,
+            search_key,
+            category=category,
+            engine=current_app.config["SEARCH_ENGINE"])
+        payload = paginate_posts(query, rank=rank)
+    except (InvalidCursor, UnknownCategory) as e:
+        return bad_request(str(e))
+    tag_listing(payload, category)
+    return jsonify(payload)
+
+
+@api.route("/posts/suggest", methods=["GET"])
+def suggest_posts():
+    prefix = request.args.get("prefix", "", type=str)
+    current_app.logger.info(f"Suggesting titles for {prefix}")
+    if len(prefix.strip()) < current_app.config["SUGGESTIONS_MIN_PREFIX"]:
+        return jsonify({"suggestions": []})
+    try:
+        suggestions = suggest_titles(prefix, current_app.config["SUGGESTIONS_LIMIT"])
+    except SQLAlchemyError as e:
+        current_app.logger.error(e)
+        db.session.rollback()
+        return internal_error("Encounter unexpected error")
+    return jsonify({"suggestions": suggestions})
+
+
+@api.route("/posts/export", methods=["GET"])
+def export_posts():
+    current_app.logger.info("Exporting posts")
+    try:
+        start = parse_date(request.args.get("start"))
+        end = parse_date(request.args.get("end"))
+    except ValueError:
+        return bad_request("start and end must be dates in the format YYYY-MM-DD")
+    try:
+        query = export_query(request.args.get("category"), start, end)
+    except UnknownCategory as e:
+        return bad_request(str(e))
+    return current_app.response_class(
+        stream_with_context(iter_ndjson(query)),
+        mimetype="application/x-ndjson")
 
 
 @api.route("/posts/max-id", methods=["GET"])
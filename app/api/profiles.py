@@ -0,0 +1,124 @@
+from functools import partial
+
+from flask import current_app
+
+from . import api
+from .. import http_client
+from ..cache import RefreshingCache, TagClock
+from .auth import get_access_token
+from .utils import mask_email
+
+
+def _profile(user):
+    return {
+        "created_time": user["created_at"],
+        "username": user["username"],
+        "email": mask_email(user["email"]),
+        "picture": user["picture"]
+    }
+
+
+def search_profile(username):
+    """Look a user up in Auth0, returning the public profile or None."""
+    access_token = get_access_token()
+    res = http_client.get(
+        f"{current_app.config['AUTH0_API_BASE_URL']}/users?q=username%3A%22{username}%22&search_engine=v3",
+        headers={
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        }
+    )
+    res.raise_for_status()
+    data = res.json()
+    if not len(data):
+        return None
+    return _profile(data[0])
+
+
+def _lucene_term(username):
+    escaped = username.replace("\\", "\\\\").replace('"', '\\"')
+    return f'username:"{escaped}"'
+
+
+def search_profiles(usernames):
+    """Look many users up in Auth0 with one search per
+    ``PROFILE_SEARCH_CHUNK`` usernames, returning the public profiles of
+    the ones that exist keyed by username as requested. Auth0 matches
+    usernames case-insensitively, so results are mapped back the same
+    way."""
+    chunk_size = current_app.config["PROFILE_SEARCH_CHUNK"]
+    profiles = {}
+    for offset in range(0, len(usernames), chunk_size):
+        chunk = usernames[offset:offset + chunk_size]
+        requested = {}
+        for username in chunk:
+            requested.setdefault(username.lower(), []).append(username)
+        access_token = get_access_token()
+        res = http_client.get(
+            f"{current_app.config['AUTH0_API_BASE_URL']}/users",
+            params={
+                "q": " OR ".join(_lucene_term(username) for username in chunk),
+                "search_engine": "v3",
+                "per_page": len(chunk)
+            },
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json"
+            }
+        )
+        res.raise_for_status()
+        for user in res.json():
+            for username in requested.get((user.get("username") or "").lower(), ()):
+                profiles[username] = _profile(user)
+    return profiles
+
+
+def _load_profile(app, username):
+    # may run on a background thread, outside of the request
+    with app.app_context():
+        return search_profile(username)
+
+
+def _load_profiles(app, usernames):
+    with app.app_context():
+        return search_profiles(usernames)
+
+
+@api.record_once
+def init_app(state):
+    app = state.app
+    app.extensions["profile_cache"] = RefreshingCache(
+        maxsize=app.config["PROFILE_CACHE_SIZE"],
+        ttl=app.config["PROFILE_CACHE_TTL"],
+        stale_ttl=app.config["PROFILE_CACHE_STALE_TTL"],
+        negative_ttl=app.config["PROFILE_CACHE_NEGATIVE_TTL"],
+        invalidations=TagClock(app.config["PROFILE_CACHE_INVALIDATION_FILE"]))
+
+
+def profile_cache():
+    return current_app.extensions["profile_cache"]
+
+
+def get_profile(username):
+    """The public profile of a user, or None when there is no such user.
+
+    Profiles come from ``profile_cache`` and only reach Auth0 on a miss or
+    to refresh a stale entry. Auth0 usernames are case-insensitive, so the
+    cache is keyed by the lower cased username.
+    """
+    return profile_cache().get(
+        username.lower(), partial(_load_profile, current_app._get_current_object()))
+
+
+def get_profiles(usernames):
+    """Public profiles of ``usernames``, None for unknown users, searching
+    Auth0 only for the ones missing from ``profile_cache``."""
+    profiles = profile_cache().get_many(
+        list(dict.fromkeys(username.lower() for username in usernames)),
+        partial(_load_profiles, current_app._get_current_object()))
+    return {username: profiles[username.lower()] for username in usernames}
+
+
+def invalidate_profile(username):
+    """Drop the cached profile from every worker of the host."""
+    profile_cache().delete(username.lower())
@@ -1,10 +1,12 @@
 import boto3
-from flask import current_app, jsonify, request
+from flask import current_app, request
 from sqlalchemy.exc import SQLAlchemyError
 import simplejson as json
 
 from . import api
-from ..models import Reason, Report
+from ..encoding import jsonify
+from ..models import Report, reason_registry
+from .conditional import conditional_response
 from .errors import internal_error
 from .validations import ReportInput
 from .. import db
@@ -17,12 +19,15 @@ sns_client = boto3.client("sns")
 @api.route("/reasons", methods=["GET"])
 def get_reasons():
     current_app.logger.info("Retrieving all report reasons")
+
+    def build():
+        return jsonify({"reasons": reason_registry.names()})
+
     try:
-        reasons = Reason.query.with_entities(Reason.name).all()
+        return conditional_response(build, reason_registry.etag(), max_age=3600)
     except SQLAlchemyError as e:
         current_app.logger.error(e)
         return internal_error("Encounter unexpected error")
-    return jsonify({"reasons": [r[0] for r in reasons]})
 
 
 @api.route("/reports", methods=["POST"])
@@ -1,31 +1,26 @@
-from flask import jsonify, request, current_app, url_for
+from flask import request, current_app, url_for
 from werkzeug.utils import secure_filename
 from botocore.exceptions import ClientError
+from sqlalchemy.orm import aliased
 import requests
 
 from . import api
+from ..encoding import jsonify
 from ..models import Post, Image as ImageModel, Comment
 from .errors import bad_request, not_found, internal_error
-from .. import db
+from .. import db, http_client
 from .auth import get_access_token
-from .utils import mask_email, upload_image_to_s3
+from .pagination import paginate_posts, InvalidCursor
+from .profiles import get_profile, get_profiles, invalidate_profile
+from .utils import upload_image_to_s3
 
 
 @api.route("/users/<string:username>/posts", methods=["GET"])
 def get_posts_by_username(username):
-    page = request.args.get("page", 1, type=int)
-    pagination = Post.query.filter_by(author=username) \
-        .order_by(Post.created_time.desc()) \
-        .paginate(
-            page, 
-            per_page=current_app.config["POSTS_PER_PAGE"],
-            error_out=False)
-    posts = pagination.items
-    return jsonify({
-        "posts": [post.to_json() for post in posts],
-        "limit": current_app.config["POSTS_PER_PAGE"],
-        "count": pagination.total
-    })
+    try:
+        return jsonify(paginate_posts(Post.query.filter_by(author=username)))
+    except InvalidCursor as e:
+        return bad_request(str(e))
 
 
 @api.route("/users/<string:username>/images/upload", methods=["POST"])
@@ -55,49 +50,55 @@ def image_upload(username):
 
 @api.route("/users/<string:username>/commented_posts", methods=["GET"])
 def get_commented_post_by_username(username):
-    page = request.args.get("page", 1, type=int)
-    pagination = Post.query.join(Comment, Post.id == Comment.post_id) \
+    # the user's comments newest first along ix_comments_author_created_time_id,
+    # keeping only the latest one on each post, which
+    # ix_comments_author_post_id_created_time checks per row
+    newer = aliased(Comment)
+    query = Post.query \
+        .join(Comment, Comment.post_id == Post.id) \
         .filter(Comment.author == username) \
-        .order_by(Post.created_time.desc()) \
-        .paginate(
-            page, 
-            per_page=current_app.config["POSTS_PER_PAGE"],
-            error_out=False)
-    posts = pagination.items
+        .filter(~db.session.query(newer.id).filter(
+            newer.author == Comment.author,
+            newer.post_id == Comment.post_id,
+            newer.created_time >= Comment.created_time,
+            db.tuple_(newer.created_time, newer.id) > db.tuple_(Comment.created_time, Comment.id)
+        ).exists())
+    try:
+        return jsonify(paginate_posts(
+            query, order_by=(Comment.created_time, Comment.id)))
+    except InvalidCursor as e:
+        return bad_request(str(e))
+
+
+@api.route("/users", methods=["GET"])
+def get_users():
+    usernames = list(dict.fromkeys(u for u in request.args.get("usernames", "").split(",") if u))
+    current_app.logger.info(f"Retrieving {len(usernames)} users")
+    if not usernames:
+        return bad_request("usernames must be a comma separated list of usernames")
+    if len(usernames) > current_app.config["MAX_PROFILE_LOOKUP_USERNAMES"]:
+        return bad_request(f"At most {current_app.config['MAX_PROFILE_LOOKUP_USERNAMES']} users can be looked up at once")
+    try:
+        profiles = get_profiles(usernames)
+    except requests.RequestException as e:
+        current_app.logger.error(e)
+        return internal_error("Unexpecter error")
     return jsonify({
-        "posts": [post.to_json() for post in posts],
-        "limit": current_app.config["POSTS_PER_PAGE"],
-        "count": pagination.total
+        "users": [profiles[u] for u in usernames if profiles.get(u)],
+        "missing": [u for u in usernames if not profiles.get(u)]
     })
 
 
 @api.route("/users/<string:username>", methods=["GET"])
 def get_user_by_username(username):
     try:
-        access_token = get_access_token()
-        res = requests.get(
-            f"https://{current_app.config['AUTH0_API_DOMAIN']}/api/v2/users?q=username%3A%22{username}%22&search_engine=v3",
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            }
-        )
-        res.raise_for_status()
-        data = res.json()
-        if not len(data):
-            return not_found("User is not found")
-        user = data[0]
-        return jsonify({
-            "user": {
-                "created_time": user["created_at"],
-                "username": user["username"],
-                "email": mask_email(user["email"]),
-                "picture": user["picture"]
-            }
-        })
+        user = get_profile(username)
     except requests.RequestException as e:
         current_app.logger.error(e)
         return internal_error("Unexpecter error")
+    if user is None:
+        return not_found("User is not found")
+    return jsonify({"user": user})
 
 
 @api.route("/users/profile-image", methods=["POST"])
@@ -123,8 +124,8 @@ def profile_image_upload():
     
     try:
         access_token = get_access_token()
-        res = requests.patch(
-            f"https://{current_app.config['AUTH0_API_DOMAIN']}/api/v2/users/{user_id}",
+        res = http_client.patch(
+            f"{current_app.config['AUTH0_API_BASE_URL']}/users/{user_id}",
             json={
                 "user_metadata": {
                     "picture": image_url
@@ -138,6 +139,7 @@ def profile_image_upload():
         if res.status_code == 404:
             return not_found("User is not found")
         res.raise_for_status()
+        invalidate_profile(username)
         return jsonify({
             "message": "Profile image is uploaded successfully"
         })
@@ -4,7 +4,8 @@ import uuid
 import boto3
 from botocore.exceptions import ClientError
 from flask import current_app
-from PIL import Image
+
+from ..images import image_pool, make_thumbnail
 
 
 def mask_email(email):
@@ -15,15 +16,13 @@ def mask_email(email):
 
 
 def upload_image_to_s3(bucket, image, username):
-    # resize the image
-    image = Image.open(io.BytesIO(image.read()))
-    image.thumbnail((500, 500))
+    # resize the image, off the request greenlet
+    data, image_format = image_pool.run(
+        make_thumbnail, image.read(), current_app.config["IMAGE_THUMBNAIL_SIZE"])
 
     # prepare for S3 upload
-    buffer = io.BytesIO()
-    image.save(buffer, image.format)
-    buffer.seek(0)
-    image_name = f"{uuid.uuid4().hex}.{image.format.lower()}"
+    buffer = io.BytesIO(data)
+    image_name = f"{uuid.uuid4().hex}.{image_format.lower()}"
 
     s3_client = boto3.client("s3")
     aws_region = current_app.config["AWS_REGION"]
@@ -34,7 +33,7 @@ def upload_image_to_s3(bucket, image, username):
         Bucket=bucket,
         Key=image_name,
         Metadata={"username": username},
-        ContentType=f"image/{image.format.lower()}"
+        ContentType=f"image/{image_format.lower()}"
     )
 
     image_url = f"https://{bucket}.s3-{aws_region}.amazonaws.com/{image_name}"
@@ -1,48 +1,55 @@
+import jsonschema
 from flask_inputs import Inputs
 from flask_inputs.validators import JsonSchema
-from wtforms.validators import DataRequired
-
-
-create_post_schema = {
-    "type": "object",
-    "properties": {
-        "start_date": { "type": "string", "format": "date", "minLength": 1 },
-        "end_date": { "type": "string", "format": "date", "minLength": 1 },
-        "title": { "type": "string", "minLength": 1 },
-        "category": { 
-            "type": "string", 
-            "enum": [
-                "Làm đẹp - Sức khỏe",
-                "Thời trang - Phụ kiện",
-                "Điện tử",
-                "Thực phẩm",
-                "Nhà cửa",
-                "Voucher - Thẻ cào",
-                "Thể thao - Dã ngoại",
-                "Điện gia dụng",
-                "Sách - Quà tặng",
-                "Mẹ và bé",
-                "Bia rượu",
-                "Trò chơi",
-                "Xe cộ",
-                "Du lịch",
-                "Ăn uống"
-            ] 
+from wtforms.validators import DataRequired, ValidationError
+
+from ..models import category_registry, reason_registry
+
+
+class RegistryJsonSchema(JsonSchema):
+    """JsonSchema built on every validation from a reference data registry,
+    so enums of category or reason names follow the tables without a query."""
+
+    def __init__(self, schema_factory, registry, message=None):
+        super().__init__(schema=None, message=message)
+        self.schema_factory = schema_factory
+        self.registry = registry
+
+    def __call__(self, form, field):
+        try:
+            jsonschema.validate(field.data, self.schema_factory(self.registry.names()))
+        except jsonschema.ValidationError as e:
+            if self.message:
+                raise ValidationError(self.message)
+
+            raise ValidationError(e.message)
+
+
+def create_post_schema(category_names):
+    return {
+        "type": "object",
+        "properties": {
+            "start_date": { "type": "string", "format": "date", "minLength": 1 },
+            "end_date": { "type": "string", "format": "date", "minLength": 1 },
+            "title": { "type": "string", "minLength": 1 },
+            "category": { 
+                "type": "string", 
+                "enum": category_names
+            },
+            "description": { "type": "string" },
+            "url": { "$ref": "#/definitions/valid_url" },
+            "coupon_code": { "type": "string" },
+            "image_url": { "$ref": "#/definitions/valid_url" }
         },
-        "description": { "type": "string" },
-        "url": { "$ref": "#/definitions/valid_url" },
-        "coupon_code": { "type": "string" },
-        "image_url": { "$ref": "#/definitions/valid_url" }
-    },
-    "definitions": {
-        "valid_url": { "format": "uri", "pattern": "^https?://" }
-    },
-    "required": ["start_date", "end_date", "title", "category"]
-}
+        "definitions": {
+            "valid_url": { "format": "uri", "pattern": "^https?://" }
+        },
+        "required": ["start_date", "end_date", "title", "category"]
+    }
 
 
 class CreatePostInput(Inputs):
-    json = [JsonSchema(schema=create_post_schema)]
+    json = [RegistryJsonSchema(create_post_schema, category_registry)]
 
 
 create_comment_schema = {
@@ -74,38 +81,30 @@ class UpdatePostVoteInput(Inputs):
     json = [JsonSchema(schema=update_post_vote_schema)]
 
 
-report_schema = {
-    "type": "object",
-    "properties": {
-        "reason": {
-            "type": "string",
-            "enum": [
-                "Nội dung không phù hợp",
-                "Spam",
-                "Không có tại Việt Nam",
-                "Bán tư nhân",
-                "Đã có",
-                "Hết hạn",
-                "Quảng cáo",
-                "Lý do khác"
-            ]
-        },
-        "post_id": {
-            "type": "integer"
-        },
-        "comment_id": {
-            "type": "integer"
+def report_schema(reason_names):
+    return {
+        "type": "object",
+        "properties": {
+            "reason": {
+                "type": "string",
+                "enum": reason_names
+            },
+            "post_id": {
+                "type": "integer"
+            },
+            "comment_id": {
+                "type": "integer"
+            },
+            "description": {
+                "type": "string"
+            }
         },
-        "description": {
-            "type": "string"
-        }
-    },
-    "anyOf": [
-        { "required": ["reason", "post_id"] },
-        { "required": ["reason", "comment_id"] }
-    ]
-}
+        "anyOf": [
+            { "required": ["reason", "post_id"] },
+            { "required": ["reason", "comment_id"] }
+        ]
+    }
 
 
 class ReportInput(Inputs):
-    json = [JsonSchema(schema=report_schema)]
\ No newline at end of file
+    json = [RegistryJsonSchema(report_schema, reason_registry)]
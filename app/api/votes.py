@@ -1,10 +1,14 @@
-from flask import jsonify, request, current_app
-from sqlalchemy.exc import SQLAlchemyError
+from flask import request, current_app
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 from . import api
+from ..encoding import jsonify
 from ..models import Post, Vote, VoteTypeEnum
+from ..vote_aggregator import vote_aggregator
 from .. import db
+from .caching import invalidate_post
 from .errors import bad_request, forbidden, not_found, internal_error
+from .pagination import keyset_page, InvalidCursor
 from .validations import UpdatePostVoteInput
 
 
@@ -12,51 +16,121 @@ from .validations import UpdatePostVoteInput
 def update_post_votes(id):
     current_app.logger.info(f"Updating vote count for post {id}")
     username = request.headers.get("username")
+    if not username:
+        return bad_request("Missing username header")
 
     validator = UpdatePostVoteInput(request)
     if not validator.validate():
         return bad_request(validator.errors)
-    
+
+    if request.json.get("vote_action") == "increment":
+        vote_type = VoteTypeEnum.INCREMENT
+    else:
+        vote_type = VoteTypeEnum.DECREMENT
+
+    aggregate = current_app.config["VOTE_AGGREGATION"]
+    generation = None
+    if aggregate:
+        vote_aggregator.start(current_app._get_current_object())
+
     try:
-        post = Post.query.with_for_update(of=Post).filter(Post.id == id).first()
-        if not post:
-            return not_found("Post is not found")
-        vote = Vote.query.filter_by(post_id=id, voter=username).first()
-        if vote:
+        if aggregate:
+            generation = vote_aggregator.begin(id)
+        vote_id = Vote.cast(id, username, vote_type)
+        if vote_id is None:
+            db.session.rollback()
             return bad_request(f"{username} đã bình chọn")
-
-        action = request.json.get("vote_action")
-        if action == "increment":
-            post.votes += 1
-            vote_type = VoteTypeEnum.INCREMENT
-        else:
-            post.votes -= 1
-            vote_type = VoteTypeEnum.DECREMENT
-
-        new_vote = Vote(
-            post_id=id,
-            voter=username,
-            vote_type=vote_type
-        )
-        db.session.add(post)
-        db.session.add(new_vote)
+        if not aggregate:
+            Post.add_votes(id, vote_type.delta)
         db.session.commit()
+        if aggregate:
+            vote_aggregator.add(id, vote_type.delta, generation)
+    except IntegrityError:
+        # the vote references a post that does not exist
+        db.session.rollback()
+        return not_found("Post is not found")
     except SQLAlchemyError as e:
         current_app.logger.error(e)
         db.session.rollback()
         return internal_error("Encounter unexpected error")
-    return jsonify(post.to_json())
+    finally:
+        if generation is not None:
+            vote_aggregator.end(generation)
+    invalidate_post(id)
+    return jsonify(Post.query.get(id).to_json())
 
 
 @api.route("/posts/<int:id>/votes", methods=["GET"])
 def get_post_votes(id):
     current_app.logger.info(f"Retrieving votes for post {id}")
-    post = Post.query.filter(Post.id == id).first()
+    post = db.session.query(Post.id).filter(Post.id == id).first()
     if not post:
         return not_found("Post is not found")
-    votes = Vote.query.filter_by(post_id=id)
+    if request.args.get("view") == "summary":
+        return jsonify(vote_summary(id))
+
+    per_page = current_app.config["VOTES_PER_PAGE"]
+    try:
+        votes, next_cursor = keyset_page(
+            Vote.query.filter_by(post_id=id),
+            Vote.created_time, Vote.id,
+            request.args.get("cursor"), per_page)
+    except InvalidCursor as e:
+        return bad_request(str(e))
+    return jsonify({
+        "votes": [v.to_json() for v in votes],
+        "limit": per_page,
+        "next_cursor": next_cursor
+    })
+
+
+def vote_summary(post_id):
+    """Vote totals and latest voters of a post.
+
+    The totals come from one grouped count and the voters from the head of
+    ``ix_votes_post_id_created_time_id``, so no vote row is loaded whatever
+    the number of votes.
+    """
+    totals = dict(
+        db.session.query(Vote.vote_type, db.func.count(Vote.id))
+        .filter(Vote.post_id == post_id)
+        .group_by(Vote.vote_type)
+        .all())
+    recent = db.session.query(Vote.voter, Vote.vote_type, Vote.created_time) \
+        .filter(Vote.post_id == post_id) \
+        .order_by(Vote.created_time.desc(), Vote.id.desc()) \
+        .limit(current_app.config["RECENT_VOTERS"]) \
+        .all()
+    return {
+        "increments": totals.get(VoteTypeEnum.INCREMENT, 0),
+        "decrements": totals.get(VoteTypeEnum.DECREMENT, 0),
+        "recent_voters": [{
+            "voter": voter,
+            "vote_type": vote_type.value,
+            "created_time": created_time
+        } for voter, vote_type, created_time in recent]
+    }
+
+
+@api.route("/users/<string:username>/votes", methods=["GET"])
+def get_user_votes(username):
+    current_app.logger.info(f"Retrieving votes of {username}")
+    try:
+        post_ids = [int(i) for i in request.args.get("post_ids", "").split(",") if i]
+    except ValueError:
+        return bad_request("post_ids must be a comma separated list of post ids")
+    if len(post_ids) > current_app.config["MAX_VOTE_LOOKUP_IDS"]:
+        return bad_request(f"At most {current_app.config['MAX_VOTE_LOOKUP_IDS']} post ids can be looked up at once")
+    votes = []
+    if post_ids:
+        votes = db.session.query(Vote.post_id, Vote.id, Vote.vote_type) \
+            .filter(Vote.voter == username, Vote.post_id.in_(post_ids)) \
+            .all()
     return jsonify({
-        "votes": [v.to_json() for v in votes]
+        "votes": {
+            str(post_id): {"id": id, "vote_type": vote_type.value}
+            for post_id, id, vote_type in votes
+        }
     })
 
 
@@ -64,25 +138,32 @@ def get_post_votes(id):
 def revoke_vote(post_id, vote_id):
     current_app.logger.info(f"Revoke vote {vote_id} for post {post_id}")
     user = request.headers.get("username")
+    aggregate = current_app.config["VOTE_AGGREGATION"]
+    generation = None
+    if aggregate:
+        vote_aggregator.start(current_app._get_current_object())
     try:
-        post = Post.query.with_for_update(of=Post).filter(Post.id == post_id).first()
-        if not post:
-            return not_found("Post is not found")
-        vote = Vote.query.filter_by(post_id=post_id, id=vote_id).first()
-        if not vote:
-            return not_found("Vote is not found")
-        if vote.voter != user:
+        if aggregate:
+            generation = vote_aggregator.begin(post_id)
+        vote_type = Vote.revoke(vote_id, post_id, user)
+        if vote_type is None:
+            db.session.rollback()
+            if not Post.query.filter(Post.id == post_id).first():
+                return not_found("Post is not found")
+            if not Vote.query.filter_by(post_id=post_id, id=vote_id).first():
+                return not_found("Vote is not found")
             return forbidden("Vote does not belong to the user")
-        if vote.vote_type.value == "increment":
-            post.votes -= 1
-        else:
-            post.votes += 1
-        db.session.add(post)
-        db.session.delete(vote)
+        if not aggregate:
+            Post.add_votes(post_id, -vote_type.delta)
         db.session.commit()
+        if aggregate:
+            vote_aggregator.add(post_id, -vote_type.delta, generation)
+        invalidate_post(post_id)
         return "Deleted"
     except SQLAlchemyError as e:
         current_app.logger.error(e)
         db.session.rollback()
         return internal_error("Encounter unexpected error")
-    
\ No newline at end of file
+    finally:
+        if generation is not None:
+            vote_aggregator.end(generation)
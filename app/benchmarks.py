@@ -0,0 +1,218 @@
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from . import db
+from .encoding import OrjsonEncoder, StdlibEncoder, orjson
+from .models import Category, Post, Vote
+
+
+BENCH_AUTHOR = "__bench__"
+
+WORDS = [
+    "điện", "thoại", "máy", "tính", "giày", "áo", "khoác", "sữa", "bỉm",
+    "nồi", "chiên", "không", "dầu", "tai", "nghe", "đồng", "hồ", "son",
+    "kem", "chống", "nắng", "vali", "bia", "rượu", "vang", "xe", "đạp",
+    "sách", "khuyến", "mãi", "giảm", "giá", "combo", "quà", "tặng"
+]
+
+
+def _timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def seed_posts(rows, chunk_size=5000):
+    """Insert ``rows`` synthetic posts owned by the benchmark author."""
+    category_ids = [c.id for c in Category.query.all()]
+    now = datetime.utcnow()
+    for offset in range(0, rows, chunk_size):
+        chunk = []
+        for i in range(offset, min(offset + chunk_size, rows)):
+            chunk.append({
+                "author": BENCH_AUTHOR,
+                "title": " ".join(random.choices(WORDS, k=6)),
+                "description": " ".join(random.choices(WORDS, k=30)),
+                "start_date": now,
+                "end_date": now + timedelta(days=7),
+                "created_time": now - timedelta(seconds=i),
+                "category_id": random.choice(category_ids),
+                "votes": 0,
+                "comment_count": 0
+            })
+        db.session.execute(Post.__table__.insert(), chunk)
+        db.session.commit()
+
+
+def remove_seeded_posts():
+    Post.query.filter_by(author=BENCH_AUTHOR).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def bench_search(rows, repeat, per_page, keep=False):
+    """Compare the ilike and full text search engines on seeded posts.
+
+    Each run fetches the first page and its total count, like a
+    ``/posts/search`` request does.
+    """
+    from .search import search_query
+
+    print(f"Seeding {rows} posts")
+    seed_posts(rows)
+    db.session.execute("ANALYZE posts")
+    try:
+        cases = [
+            ("điện thoại", None),
+            ("dien thoai", None),
+            ("nồi chiên", "Điện gia dụng"),
+            ("giảm giá", "Thời trang - Phụ kiện")
+        ]
+        print(f"{'engine':<10}{'term':<14}{'category':<24}{'hits':>8}{'p50 ms':>10}{'p95 ms':>10}")
+        for engine in ("ilike", "fulltext"):
+            for term, category in cases:
+                query, rank = search_query(Post.query, term, category=category, engine=engine)
+                order = [Post.created_time.desc()]
+                if rank is not None:
+                    order.insert(0, rank)
+
+                def run():
+                    query.order_by(*order).limit(per_page).all()
+                    return query.order_by(None).count()
+
+                hits = run()
+                p50, p95 = _timed(run, repeat)
+                print(f"{engine:<10}{term:<14}{category or 'All':<24}{hits:>8}{p50:>10.2f}{p95:>10.2f}")
+    finally:
+        db.session.rollback()
+        if not keep:
+            remove_seeded_posts()
+
+
+def _sample_payloads(posts):
+    now = datetime.utcnow()
+    description = " ".join(random.choices(WORDS, k=120))
+    listing = {
+        "posts": [{
+            "id": i,
+            "url": f"/api/v1/posts/{i}",
+            "coupon_code": "GIAMGIA50",
+            "product_url": "https://tiki.vn/dien-thoai",
+            "start_date": now,
+            "end_date": now + timedelta(days=7),
+            "created_time": now,
+            "title": " ".join(random.choices(WORDS, k=8)),
+            "category": "Điện tử",
+            "description": description,
+            "comment_count": 12,
+            "author": "anh",
+            "image_url": "https://giare.s3-ap-southeast-2.amazonaws.com/a.jpg",
+            "votes": 42
+        } for i in range(posts)],
+        "limit": posts,
+        "count": 10000
+    }
+    comments = {
+        "comments": [{"id": i, "author": "anh", "created_time": now, "text": description} for i in range(posts)],
+        "count": posts
+    }
+    votes = {
+        "votes": [{"id": i, "post_id": 1, "voter": "anh", "vote_type": "increment", "created_time": now} for i in range(posts)]
+    }
+    report = {"id": 1, "reason": "Spam", "description": description, "comment_id": None, "post_id": 1}
+    return {"posts": listing, "comments": comments, "votes": votes, "report": report}
+
+
+def bench_encoders(posts, repeat):
+    """Compare the stdlib and orjson response encoders on API-shaped payloads."""
+    encoders = [StdlibEncoder()]
+    if orjson is None:
+        print("orjson is not installed, only timing the stdlib encoder")
+    else:
+        encoders.append(OrjsonEncoder(sort_keys=current_app.config["JSON_SORT_KEYS"]))
+
+    print(f"{'payload':<10}{'encoder':<10}{'bytes':>10}{'p50 us':>10}{'p95 us':>10}")
+    for name, payload in _sample_payloads(posts).items():
+        decoded = []
+        for encoder in encoders:
+            body = encoder.dumps(payload)
+            decoded.append(json.loads(body))
+            p50, p95 = _timed(lambda: encoder.dumps(payload), repeat)
+            print(f"{name:<10}{encoder.name:<10}{len(body):>10}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}")
+        if any(d != decoded[0] for d in decoded):
+            print(f"WARNING: encoders disagree on the {name} payload")
+
+
+def bench_votes(app, voters, concurrency):
+    """Hammer a single seeded post with concurrent votes from greenlets.
+
+    Every voter goes through the full ``PUT /posts/<id>/votes`` handler
+    with gevent and psycopg2 patched like in ``patched.py``. The engine is
+    disposed after patching so every connection is opened on gevent sockets.
+    The final vote count is checked against the number of accepted votes.
+    """
+    from gevent import monkey
+    monkey.patch_all()
+    from gevent.pool import Pool
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+    # drop any connections opened before patching, they would block the hub
+    db.engine.dispose()
+
+    now = datetime.utcnow()
+    post = Post(
+        author=BENCH_AUTHOR,
+        title="bench votes",
+        start_date=now,
+        end_date=now + timedelta(days=7),
+        category_id=Category.query.first().id,
+        votes=0)
+    db.session.add(post)
+    db.session.commit()
+    post_id = post.id
+
+    client = app.test_client()
+    latencies = []
+    statuses = []
+
+    def vote(i):
+        start = time.perf_counter()
+        response = client.put(
+            f"/api/v1/posts/{post_id}/votes",
+            json={"vote_action": "increment" if i % 4 else "decrement"},
+            headers={"username": f"{BENCH_AUTHOR}{i}"})
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses.append(response.status_code)
+
+    try:
+        print(f"Casting {voters} votes on post {post_id} from {concurrency} greenlets")
+        start = time.perf_counter()
+        pool = Pool(concurrency)
+        # every voter votes twice, the second vote must be rejected
+        pool.map(vote, list(range(voters)) * 2)
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        accepted = statuses.count(200)
+        expected = sum(1 if i % 4 else -1 for i in range(voters))
+        db.session.expire_all()
+        votes = Post.query.get(post_id).votes
+        print(f"requests: {len(statuses)}, accepted: {accepted}, rejected: {statuses.count(400)}, "
+              f"errors: {len(statuses) - accepted - statuses.count(400)}")
+        print(f"throughput: {len(statuses) / elapsed:.0f} req/s, "
+              f"p50: {statistics.median(latencies):.1f} ms, "
+              f"p95: {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms")
+        print(f"votes on post: {votes}, expected: {expected}, {'OK' if votes == expected else 'MISMATCH'}")
+    finally:
+        db.session.rollback()
+        Vote.query.filter_by(post_id=post_id).delete(synchronize_session=False)
+        Post.query.filter_by(id=post_id).delete(synchronize_session=False)
+        db.session.commit()
@@ -0,0 +1,457 @@
+from collections import OrderedDict
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+
+logger = logging.getLogger(__name__)
+
+
+_missing = object()
+
+
+class LRUCache:
+    """A bounded in-process mapping with optional per-entry expiry.
+
+    The least recently used entry is evicted once ``maxsize`` is reached and
+    entries older than ``ttl`` seconds are treated as missing.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value, expires_at = self._data.get(key, (_missing, None))
+            if value is not _missing and expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                value = _missing
+            if value is _missing:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_if(self, predicate):
+        """Delete every entry whose value satisfies ``predicate``."""
+        with self._lock:
+            keys = [k for k, (value, _) in self._data.items() if predicate(value)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TagClock:
+    """When each tag was last invalidated, shared by the workers of a host.
+
+    Tags hash to one of ``slots`` slots of a memory mapped file, each
+    holding the time in nanoseconds of its latest invalidation, so checking
+    the tags of an entry costs a few memory reads and no system call. Tags
+    sharing a slot only cause extra misses.
+    """
+
+    def __init__(self, path, slots=65536):
+        self.slots = slots
+        size = slots * 8
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def _offset(self, tag):
+        return zlib.crc32(tag.encode()) % self.slots * 8
+
+    def touch(self, tags):
+        now = time.time_ns()
+        for tag in tags:
+            offset = self._offset(tag)
+            if struct.unpack_from("<q", self._map, offset)[0] < now:
+                struct.pack_into("<q", self._map, offset, now)
+
+    def latest(self, tags):
+        return max((struct.unpack_from("<q", self._map, self._offset(tag))[0] for tag in tags), default=0)
+
+
+class MemoryBackend:
+    """Keeps cached responses in an in-process LRU.
+
+    Invalidations are recorded in a ``TagClock`` shared by the workers, and
+    an entry is only served when none of its tags was invalidated since its
+    response started rendering, so a write is seen by every worker at once.
+    """
+    name = "memory"
+
+    def __init__(self, maxsize, clock):
+        self._entries = LRUCache(maxsize=maxsize)
+        self._clock = clock
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, tags, since = entry
+        if self._clock.latest(tags) >= since:
+            self._entries.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl, tags, since):
+        self._entries.set(key, (value, frozenset(tags), since), ttl=ttl)
+
+    def invalidate(self, tags):
+        self._clock.touch(tags)
+        # the clock already hides them, this only frees the memory early
+        tags = set(tags)
+        self._entries.delete_if(lambda entry: not tags.isdisjoint(entry[1]))
+
+    def clear(self):
+        self._entries.clear()
+
+
+class RedisBackend:
+    """Keeps cached responses in Redis so every worker shares them.
+
+    ``client`` is anything that speaks the redis-py API used below
+    (``get``, ``mget``, ``set``, ``sadd``, ``expire``, ``smembers``,
+    ``delete``, ``pipeline``), which makes it easy to swap in a local
+    stand-in. Each tag is a set of the keys cached under it, next to the
+    time it was last invalidated. A response is not stored, or is dropped
+    again right after, when one of its tags was invalidated since it
+    started rendering.
+    """
+    name = "redis"
+
+    def __init__(self, client, prefix="giare:cache:", invalidation_ttl=3600):
+        self.client = client
+        self.prefix = prefix
+        self.invalidation_ttl = invalidation_ttl
+
+    def _tag_key(self, tag):
+        return f"{self.prefix}tag:{tag}"
+
+    def _invalidated_key(self, tag):
+        return f"{self.prefix}tag:{tag}:ts"
+
+    def _invalidated_since(self, tags, since):
+        stamps = self.client.mget([self._invalidated_key(tag) for tag in tags])
+        return any(stamp is not None and int(stamp) >= since for stamp in stamps)
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl, tags, since):
+        tags = list(tags)
+        if tags and self._invalidated_since(tags, since):
+            return
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, value, ex=ttl)
+        for tag in tags:
+            # a tag lives as long as the newest entry under it
+            pipe.sadd(self._tag_key(tag), self.prefix + key)
+            pipe.expire(self._tag_key(tag), ttl)
+        pipe.execute()
+        # an invalidation between the check and the write stamped its tag
+        # before reading the tag's keys, so it either deleted the entry or
+        # shows up here
+        if tags and self._invalidated_since(tags, since):
+            self.client.delete(self.prefix + key)
+
+    def invalidate(self, tags):
+        now = time.time_ns()
+        for tag in tags:
+            self.client.set(self._invalidated_key(tag), now, ex=self.invalidation_ttl)
+            keys = self.client.smembers(self._tag_key(tag))
+            self.client.delete(self._tag_key(tag), *keys)
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+class ResponseCache:
+    """Read-through cache of rendered responses with tag based invalidation.
+
+    The backend is picked by ``RESPONSE_CACHE_BACKEND``: ``memory`` (the
+    default), ``redis`` or ``none`` to disable caching. Backend failures are
+    logged and treated as misses so the cache can never fail a request.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = None
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config["RESPONSE_CACHE_BACKEND"]
+        if backend == "memory":
+            self.backend = MemoryBackend(
+                app.config["RESPONSE_CACHE_SIZE"],
+                TagClock(app.config["RESPONSE_CACHE_INVALIDATION_FILE"]))
+        elif backend == "redis":
+            import redis
+            self.backend = RedisBackend(redis.Redis.from_url(app.config["RESPONSE_CACHE_REDIS_URL"]))
+        self.ttl = app.config["RESPONSE_CACHE_TTL"]
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Response cache get failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, tags, since=None):
+        """Cache ``value`` under ``key``.
+
+        ``since`` is the ``time.time_ns()`` at which the value started being
+        computed. Both backends treat an invalidation of one of ``tags``
+        after that as invalidating the entry.
+        """
+        if since is None:
+            since = time.time_ns()
+        try:
+            self.backend.set(key, value, self.ttl, tags, since)
+        except Exception as e:
+            logger.warning(f"Response cache set failed: {e}")
+
+    def invalidate(self, *tags):
+        if not self.enabled:
+            return
+        try:
+            self.backend.invalidate(tags)
+        except Exception as e:
+            logger.warning(f"Response cache invalidation failed: {e}")
+
+    def stats(self):
+        return {
+            "backend": self.backend.name if self.enabled else None,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+class _Load:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class RefreshingCache:
+    """Bounded read-through cache for slow remote lookups.
+
+    ``load(key)`` returns the value of a key, or None when it does not
+    exist, which is cached for ``negative_ttl`` seconds only. A value is
+    served for ``ttl`` seconds, then for up to ``stale_ttl`` more seconds
+    while a background thread reloads it. Past that, or on a miss, the
+    caller waits for the load. Concurrent misses of the same key wait on a
+    single load. Failed loads are not cached.
+
+    With a ``TagClock`` as ``invalidations``, ``delete`` records the key in
+    it and every worker sharing the clock drops values it loaded before.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, stale_ttl=3600, negative_ttl=60, clock=time.monotonic,
+                 invalidations=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.invalidations = invalidations
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._loads = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        # called with the lock held
+        value, fresh_until, stale_until, since = self._data.get(key, (None, 0, 0, 0))
+        if stale_until and self.invalidations is not None and self.invalidations.latest([key]) >= since:
+            del self._data[key]
+            return None, 0, 0
+        return value, fresh_until, stale_until
+
+    def get(self, key, load):
+        now = self.clock()
+        with self._lock:
+            value, fresh_until, stale_until = self._lookup(key)
+            if stale_until > now:
+                self._data.move_to_end(key)
+        if fresh_until > now:
+            self.hits += 1
+            return value
+        if stale_until > now:
+            self.stale_hits += 1
+            self._start_load(key, load, background=True)
+            return value
+        self.misses += 1
+        pending = self._start_load(key, load, background=False)
+        pending.done.wait()
+        if pending.error:
+            raise pending.error
+        return pending.value
+
+    def get_many(self, keys, load_many):
+        """Values of ``keys``, None for the ones that do not exist.
+
+        Like ``get``, but the keys that must be loaded go to a single
+        ``load_many(keys)`` call, which returns a mapping that leaves out
+        the keys that do not exist. Keys another caller is already loading
+        are waited for instead.
+        """
+        now = self.clock()
+        values = {}
+        stale = []
+        missing = []
+        waiting = {}
+        with self._lock:
+            for key in keys:
+                value, fresh_until, stale_until = self._lookup(key)
+                if fresh_until > now:
+                    self.hits += 1
+                    values[key] = value
+                elif stale_until > now:
+                    self.stale_hits += 1
+                    values[key] = value
+                    if key not in self._loads:
+                        pending = self._loads[key] = _Load()
+                        stale.append((key, pending))
+                elif key in self._loads:
+                    self.misses += 1
+                    waiting[key] = self._loads[key]
+                else:
+                    self.misses += 1
+                    pending = self._loads[key] = _Load()
+                    missing.append((key, pending))
+        if stale:
+            threading.Thread(target=self._run_load_many, args=(stale, load_many), daemon=True).start()
+        if missing:
+            self._run_load_many(missing, load_many)
+            waiting.update(missing)
+        for key, pending in waiting.items():
+            pending.done.wait()
+            if pending.error:
+                raise pending.error
+            values[key] = pending.value
+        return values
+
+    def _run_load_many(self, pendings, load_many):
+        since = time.time_ns()
+        try:
+            loaded = load_many([key for key, _ in pendings])
+            for key, pending in pendings:
+                pending.value = loaded.get(key)
+                self.set(key, pending.value, since)
+        except Exception as e:
+            logger.warning(f"Loading {len(pendings)} keys failed: {e}")
+            for _, pending in pendings:
+                pending.error = e
+        finally:
+            with self._lock:
+                for key, _ in pendings:
+                    self._loads.pop(key, None)
+            for _, pending in pendings:
+                pending.done.set()
+
+    def _start_load(self, key, load, background):
+        with self._lock:
+            pending = self._loads.get(key)
+            if pending is not None:
+                return pending
+            pending = self._loads[key] = _Load()
+        if background:
+            threading.Thread(target=self._run_load, args=(key, load, pending), daemon=True).start()
+        else:
+            self._run_load(key, load, pending)
+        return pending
+
+    def _run_load(self, key, load, pending):
+        since = time.time_ns()
+        try:
+            pending.value = load(key)
+            self.set(key, pending.value, since)
+        except Exception as e:
+            logger.warning(f"Loading {key} failed: {e}")
+            pending.error = e
+        finally:
+            with self._lock:
+                self._loads.pop(key, None)
+            pending.done.set()
+
+    def set(self, key, value, since=None):
+        """Cache ``value``, ``since`` being the ``time.time_ns()`` at which
+        it started loading."""
+        if since is None:
+            since = time.time_ns()
+        now = self.clock()
+        if value is None:
+            fresh_until = stale_until = now + self.negative_ttl
+        else:
+            fresh_until = now + self.ttl
+            stale_until = fresh_until + self.stale_ttl
+        with self._lock:
+            self._data[key] = (value, fresh_until, stale_until, since)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        if self.invalidations is not None:
+            self.invalidations.touch([key])
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "size": len(self._data)
+        }
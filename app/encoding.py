@@ -0,0 +1,88 @@
+from datetime import date, datetime
+
+from flask import current_app, json
+from flask import jsonify as flask_jsonify
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StdlibEncoder:
+    """Flask's own json module, the reference output of the API."""
+    name = "stdlib"
+
+    def dumps(self, data):
+        # the compact separators flask.jsonify sends outside of debug
+        return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+    def response(self, data):
+        return flask_jsonify(data)
+
+
+def _orjson_default(o):
+    # same formats as flask.json.JSONEncoder so dates are byte-identical
+    if isinstance(o, datetime):
+        return http_date(o.utctimetuple())
+    if isinstance(o, date):
+        return http_date(o.timetuple())
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class OrjsonEncoder:
+    """orjson backed encoder for compact responses.
+
+    Non-ASCII characters are emitted as UTF-8 instead of ``\\u`` escapes,
+    everything else, including key order and date formats, matches
+    ``StdlibEncoder``. Pretty printed (debug) responses still go through
+    Flask.
+    """
+    name = "orjson"
+
+    def __init__(self, sort_keys=True):
+        self.option = orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            self.option |= orjson.OPT_SORT_KEYS
+
+    def dumps(self, data):
+        return orjson.dumps(data, default=_orjson_default, option=self.option)
+
+    def response(self, data):
+        if current_app.config["JSONIFY_PRETTYPRINT_REGULAR"] or current_app.debug:
+            return flask_jsonify(data)
+        return current_app.response_class(
+            self.dumps(data) + b"\n",
+            mimetype=current_app.config["JSONIFY_MIMETYPE"])
+
+
+def init_app(app):
+    """Register the response encoder picked by ``RESPONSE_ENCODER``.
+
+    ``auto`` uses orjson when it is installed and falls back to Flask's
+    encoder otherwise.
+    """
+    name = app.config["RESPONSE_ENCODER"]
+    if name == "orjson" or (name == "auto" and orjson is not None):
+        encoder = OrjsonEncoder(sort_keys=app.config["JSON_SORT_KEYS"])
+    else:
+        encoder = StdlibEncoder()
+    app.extensions["response_encoder"] = encoder
+
+
+def get_encoder():
+    return current_app.extensions["response_encoder"]
+
+
+def jsonify(*args, **kwargs):
+    """Drop-in replacement for ``flask.jsonify`` using the app's encoder."""
+    if args and kwargs:
+        raise TypeError("jsonify() behavior undefined when passed both args and kwargs")
+    elif len(args) == 1:
+        data = args[0]
+    else:
+        data = args or kwargs
+    return get_encoder().response(data)
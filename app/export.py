@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from .encoding import get_encoder
+from .models import Post
+from .search import filter_category
+
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d") if value else None
+
+
+def export_query(category=None, start=None, end=None):
+    """Posts to export, optionally limited to a category and to posts
+    created in ``[start, end)``. Raises ``UnknownCategory`` for a category
+    that does not exist.
+
+    ``yield_per`` makes psycopg2 use a server-side cursor so only one batch
+    of rows is held in memory at a time, whatever the size of the table.
+    """
+    query = filter_category(Post.query, category)
+    if start:
+        query = query.filter(Post.created_time >= start)
+    if end:
+        query = query.filter(Post.created_time < end)
+    return query.order_by(Post.id).yield_per(EXPORT_BATCH_SIZE)
+
+
+def iter_ndjson(query):
+    encoder = get_encoder()
+    for post in query:
+        yield encoder.dumps(post.to_json()) + b"\n"
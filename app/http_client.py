@@ -0,0 +1,144 @@
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+
+class CircuitBreaker:
+    """Fails calls to a host fast once it keeps failing.
+
+    After ``threshold`` consecutive failures the circuit opens and calls
+    fail without reaching the host for ``reset_timeout`` seconds. Then a
+    single trial call is let through, which closes the circuit again when
+    it succeeds.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or self.clock() - self.opened_at < self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+
+    def record(self, success):
+        with self._lock:
+            self._trial = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+
+
+class HttpClient:
+    """Shared client for the HTTP APIs the app calls, Auth0 today.
+
+    Keeps a pool of ``HTTP_POOL_SIZE`` keep-alive connections per host and
+    gives every call connect and read timeouts. Idempotent calls are
+    retried ``HTTP_MAX_RETRIES`` times on connection errors, timeouts and
+    busy or gateway errors, with jittered exponential backoff, and each
+    host has a circuit breaker. Calls are timed per host in the app
+    metrics.
+    """
+
+    def __init__(self, app=None):
+        self.session = None
+        self.breakers = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.timeout = (app.config["HTTP_CONNECT_TIMEOUT"], app.config["HTTP_READ_TIMEOUT"])
+        self.max_retries = app.config["HTTP_MAX_RETRIES"]
+        self.backoff = app.config["HTTP_RETRY_BACKOFF"]
+        self.breaker_threshold = app.config["HTTP_BREAKER_THRESHOLD"]
+        self.breaker_reset_timeout = app.config["HTTP_BREAKER_RESET_TIMEOUT"]
+        adapter = HTTPAdapter(
+            pool_connections=app.config["HTTP_POOL_HOSTS"],
+            pool_maxsize=app.config["HTTP_POOL_SIZE"])
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _breaker(self, host):
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers.setdefault(
+                host, CircuitBreaker(self.breaker_threshold, self.breaker_reset_timeout))
+        return breaker
+
+    def request(self, method, url, retry=None, **kwargs):
+        """Send a request like ``requests.request``.
+
+        ``retry`` defaults to retrying GET, HEAD, PUT and DELETE only.
+        Raises ``CircuitOpenError`` when the host's circuit is open.
+        """
+        if retry is None:
+            retry = method.upper() in ("GET", "HEAD", "PUT", "DELETE")
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).netloc
+        breaker = self._breaker(host)
+        attempts = self.max_retries + 1 if retry else 1
+        for attempt in range(attempts):
+            if not breaker.allow():
+                metrics.observe_outbound(host, "circuit_open", 0)
+                raise CircuitOpenError(f"Circuit to {host} is open")
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                breaker.record(False)
+                metrics.observe_outbound(host, "error", time.perf_counter() - start)
+                if attempt + 1 == attempts:
+                    raise
+                logger.warning(f"{method} {host} failed, retrying: {e}")
+            except Exception:
+                # anything else is not worth retrying, but still has to end
+                # a trial call or the circuit would never close again
+                breaker.record(False)
+                metrics.observe_outbound(host, "error", time.perf_counter() - start)
+                raise
+            else:
+                breaker.record(response.status_code < 500)
+                metrics.observe_outbound(host, str(response.status_code), time.perf_counter() - start)
+                if response.status_code not in RETRY_STATUSES or attempt + 1 == attempts:
+                    return response
+                logger.warning(f"{method} {host} answered {response.status_code}, retrying")
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
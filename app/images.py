@@ -0,0 +1,100 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+
+
+class ImagePoolBusy(Exception):
+    pass
+
+
+class ImagePoolBroken(Exception):
+    pass
+
+
+class ImageTimeout(Exception):
+    pass
+
+
+def make_thumbnail(data, size):
+    """Shrink an encoded image to fit in ``size``, returning the encoded
+    thumbnail and its format. Runs in a pool process."""
+    image = Image.open(io.BytesIO(data))
+    image_format = image.format
+    image.thumbnail(size)
+    buffer = io.BytesIO()
+    image.save(buffer, image_format)
+    return buffer.getvalue(), image_format
+
+
+class ImagePool:
+    """Process pool for CPU bound image work.
+
+    Decoding and resizing would block the gevent hub, and with it every
+    other request of the worker, so it runs in ``IMAGE_WORKERS`` processes
+    started with ``spawn`` to stay clear of the forked gevent state. At
+    most ``IMAGE_QUEUE_DEPTH`` images are processed or waiting at a time,
+    beyond that ``run`` raises ``ImagePoolBusy`` instead of queueing. A
+    pool broken by a crashed process is replaced on the next call.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.workers = app.config["IMAGE_WORKERS"]
+        self.timeout = app.config["IMAGE_TIMEOUT"]
+        self._slots = threading.BoundedSemaphore(app.config["IMAGE_QUEUE_DEPTH"])
+
+    def _get_executor(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"))
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _discard(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._pid = None
+        executor.shutdown(wait=False)
+
+    def run(self, fn, *args):
+        """Run ``fn(*args)`` in the pool and wait for its result.
+
+        Raises ``ImageTimeout`` after ``IMAGE_TIMEOUT`` seconds and
+        ``ImagePoolBroken`` when a pool process died.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ImagePoolBusy("Too many images are being processed")
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool as e:
+            self._slots.release()
+            self._discard(executor)
+            raise ImagePoolBroken("An image process died") from e
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError as e:
+            raise ImageTimeout(f"Image took longer than {self.timeout}s") from e
+        except BrokenProcessPool as e:
+            self._discard(executor)
+            raise ImagePoolBroken("An image process died") from e
+
+
+image_pool = ImagePool()
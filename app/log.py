@@ -0,0 +1,149 @@
+import atexit
+import json
+import logging
+import random
+import sys
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import current_app, g, request
+
+try:
+    from gevent.monkey import get_original
+except ImportError:
+    get_original = None
+
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("giare.access")
+
+WRITE_INTERVAL = 0.05
+
+
+def _original(module, name):
+    """The unpatched function, so the writer is a real OS thread that can
+    block on I/O without stalling the gevent hub."""
+    if get_original is None:
+        return getattr(__import__(module), name)
+    return get_original(module, name)
+
+
+class LogQueue:
+    """Bounded queue of log records written by a background thread.
+
+    Logging a record only appends it to a deque. Formatting and writing
+    happen on the writer thread. When ``LOG_QUEUE_SIZE`` records are
+    waiting, new ones are dropped and counted instead of blocking the
+    request, and the writer reports how many were lost.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.entries = deque()
+        self.dropped = 0
+        self._reported = 0
+        self._started = False
+
+    def put(self, record, handlers):
+        if len(self.entries) >= self.maxsize:
+            self.dropped += 1
+            return
+        self.entries.append((record, handlers))
+
+    def drain(self):
+        while True:
+            try:
+                record, handlers = self.entries.popleft()
+            except IndexError:
+                break
+            for handler in handlers:
+                # the writer is the only user of the handlers, no lock needed
+                if record.levelno >= handler.level:
+                    handler.emit(record)
+        if self.dropped > self._reported:
+            logger.warning(f"Dropped {self.dropped - self._reported} log records, the log queue was full")
+            self._reported = self.dropped
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        _original("_thread", "start_new_thread")(self._run, ())
+        atexit.register(self.drain)
+
+    def _run(self):
+        sleep = _original("time", "sleep")
+        while True:
+            try:
+                self.drain()
+            except Exception:
+                # keep writing whatever a broken record did
+                pass
+            sleep(WRITE_INTERVAL)
+
+
+class QueueHandler(logging.Handler):
+    """Hands records to the log queue for ``handlers`` to write."""
+
+    def __init__(self, queue, handlers):
+        super().__init__()
+        self.queue = queue
+        self.handlers = list(handlers)
+
+    def handle(self, record):
+        rv = self.filter(record)
+        if rv:
+            self.queue.put(record, self.handlers)
+        return rv
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"time": datetime.utcfromtimestamp(record.created).isoformat() + "Z"}
+        if isinstance(record.msg, dict):
+            entry.update(record.msg)
+        else:
+            entry["message"] = record.getMessage()
+        return json.dumps(entry, default=str)
+
+
+log_queue = LogQueue()
+
+
+def init_app(app):
+    """Route the app's log records, and JSON access logs to stdout, through
+    the log queue."""
+    log_queue.maxsize = app.config["LOG_QUEUE_SIZE"]
+    if app.logger.handlers:
+        app.logger.handlers = [QueueHandler(log_queue, app.logger.handlers)]
+
+    stdout = logging.StreamHandler(sys.stdout)
+    stdout.setFormatter(JsonFormatter())
+    access_logger.handlers = [QueueHandler(log_queue, [stdout])]
+    access_logger.setLevel(logging.INFO)
+    access_logger.propagate = False
+    log_queue.start()
+
+
+def log_access(response):
+    """Log the request as a JSON line.
+
+    Endpoints in ``ACCESS_LOG_SAMPLE_RATES`` only log that share of their
+    successful requests, errors are always logged.
+    """
+    rate = current_app.config["ACCESS_LOG_SAMPLE_RATES"].get(request.endpoint, 1.0)
+    if response.status_code < 400 and random.random() >= rate:
+        return
+    entry = {
+        "remote_addr": request.remote_addr,
+        "method": request.method,
+        "scheme": request.scheme,
+        "path": request.full_path,
+        "endpoint": request.endpoint,
+        "status": response.status_code,
+        "sample_rate": rate
+    }
+    if "request_start_time" in g:
+        entry["duration_ms"] = round((time.perf_counter() - g.request_start_time) * 1000, 1)
+    access_logger.info(entry)
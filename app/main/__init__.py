@@ -1,8 +1,16 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, current_app
+
+from ..encoding import jsonify
+from ..metrics import metrics
 
 
 main = Blueprint("main", __name__)
 
 @main.route("/healthcheck", methods=["GET"])
 def index():
-    return jsonify(status="Healthy")
\ No newline at end of file
+    return jsonify(status="Healthy")
+
+
+@main.route("/metrics", methods=["GET"])
+def get_metrics():
+    return current_app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,329 @@
+import atexit
+import bisect
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .log import _original, log_queue
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# totals of exited workers, folded into one file
+RETIRED_FILE = "retired.json"
+
+
+def _empty_totals():
+    return {"requests": {}, "latency": {}, "db_queries": {}, "db_time": {}, "outbound": {}, "log_dropped": 0}
+
+
+def _merge(totals, snapshot):
+    for name in ("requests", "db_queries", "db_time"):
+        for key, value in snapshot[name].items():
+            totals[name][key] = totals[name].get(key, 0) + value
+    for key, histogram in snapshot["latency"].items():
+        total = totals["latency"].setdefault(
+            key, {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0})
+        total["buckets"] = [a + b for a, b in zip(total["buckets"], histogram["buckets"])]
+        total["sum"] += histogram["sum"]
+        total["count"] += histogram["count"]
+    for key, call in snapshot.get("outbound", {}).items():
+        total = totals["outbound"].setdefault(key, {"count": 0, "sum": 0.0})
+        total["count"] += call["count"]
+        total["sum"] += call["sum"]
+    totals["log_dropped"] += snapshot.get("log_dropped", 0)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Metrics:
+    """Request and database metrics of one worker process.
+
+    Engine events count the queries of the current request and their time,
+    request hooks record per endpoint latency histograms and report the
+    request's own numbers in a ``Server-Timing`` header. A native writer
+    thread of every worker writes its totals to ``METRICS_DIR`` every
+    ``METRICS_WRITE_INTERVAL`` seconds, off the gevent hub, and ``render``
+    adds up the files of all workers so one scrape of ``/metrics`` covers
+    the whole gunicorn server.
+    """
+
+    def __init__(self):
+        # a real lock, the writer thread is not a greenlet and every
+        # critical section is short and never yields
+        self._lock = _original("_thread", "allocate_lock")()
+        self.directory = None
+        self._writer_pid = None
+        self._reset()
+
+    def _reset(self):
+        self.requests = {}
+        self.latency = {}
+        self.db_queries = {}
+        self.db_time = {}
+        self.outbound = {}
+        self._pid = os.getpid()
+        # unique per process, a worker reusing an exited one's pid must not
+        # overwrite its totals
+        self._filename = f"{self._pid}-{time.time_ns()}.json"
+
+    def init_app(self, app):
+        self.directory = app.config["METRICS_DIR"]
+        self.write_interval = app.config["METRICS_WRITE_INTERVAL"]
+        os.makedirs(self.directory, exist_ok=True)
+
+        # listening on the class does not create the engine, so its pool is
+        # only built once gevent has patched the process
+        event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(Engine, "handle_error", self._handle_error)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        if has_request_context() and "request_start_time" in g:
+            g.db_queries += 1
+            g.db_time += elapsed
+
+    def _handle_error(self, context):
+        # a failed statement never reaches after_cursor_execute
+        if context.connection is not None and context.execution_context is not None:
+            starts = context.connection.info.get("query_start_time")
+            if starts:
+                starts.pop()
+
+    def _before_request(self):
+        g.request_start_time = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+
+    def _after_request(self, response):
+        if "request_start_time" not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_start_time
+        endpoint = request.endpoint or "unmatched"
+        self.observe(endpoint, request.method, response.status_code, elapsed, g.db_queries, g.db_time)
+        response.headers.add(
+            "Server-Timing",
+            f'app;dur={elapsed * 1000:.1f}, db;dur={g.db_time * 1000:.1f};desc="{g.db_queries} queries"')
+        return response
+
+    def observe(self, endpoint, method, status, elapsed, db_queries, db_time):
+        with self._lock:
+            if self._pid != os.getpid():
+                # totals inherited through fork belong to the parent
+                self._reset()
+            key = f"{endpoint}|{method}|{status}"
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.latency.setdefault(
+                f"{endpoint}|{method}",
+                {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0})
+            index = bisect.bisect_left(LATENCY_BUCKETS, elapsed)
+            if index < len(LATENCY_BUCKETS):
+                histogram["buckets"][index] += 1
+            histogram["sum"] += elapsed
+            histogram["count"] += 1
+            self.db_queries[endpoint] = self.db_queries.get(endpoint, 0) + db_queries
+            self.db_time[endpoint] = self.db_time.get(endpoint, 0.0) + db_time
+        self._start_writer()
+
+    def observe_outbound(self, host, outcome, elapsed):
+        """Record a call to another service, ``outcome`` is its status
+        code, ``error`` or ``circuit_open``."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            call = self.outbound.setdefault(f"{host}|{outcome}", {"count": 0, "sum": 0.0})
+            call["count"] += 1
+            call["sum"] += elapsed
+        self._start_writer()
+
+    def _start_writer(self):
+        if self.directory is None:
+            # init_app was not called, nowhere to write to
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+        _original("_thread", "start_new_thread")(self._run_writer, ())
+        atexit.register(self._write_at_exit)
+
+    def _run_writer(self):
+        sleep = _original("time", "sleep")
+        while True:
+            sleep(self.write_interval)
+            try:
+                self.write()
+            except OSError as e:
+                logger.error(f"Writing metrics failed: {e}")
+
+    def _write_at_exit(self):
+        if self._writer_pid == os.getpid():
+            self.write()
+
+    def snapshot(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            return json.loads(json.dumps({
+                "requests": self.requests,
+                "latency": self.latency,
+                "db_queries": self.db_queries,
+                "db_time": self.db_time,
+                "outbound": self.outbound,
+                "log_dropped": log_queue.dropped
+            }))
+
+    def write(self):
+        """Write this worker's totals where ``render`` can find them."""
+        snapshot = self.snapshot()
+        path = os.path.join(self.directory, self._filename)
+        # the writer thread and a scrape may write at the same time
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, path)
+
+    def _retire(self):
+        """Fold the files of exited workers into ``RETIRED_FILE``, so a
+        scrape reads one file per live worker plus one."""
+        dead = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                pid = int(os.path.basename(path).split("-")[0].split(".")[0])
+            except ValueError:
+                continue
+            if not _alive(pid):
+                dead.append(path)
+        if not dead:
+            return
+        retired_path = os.path.join(self.directory, RETIRED_FILE)
+        try:
+            with open(retired_path) as f:
+                retired = json.load(f)
+        except (OSError, ValueError):
+            retired = _empty_totals()
+        for path in dead:
+            try:
+                with open(path) as f:
+                    _merge(retired, json.load(f))
+            except (OSError, ValueError):
+                continue
+        with open(f"{retired_path}.tmp", "w") as f:
+            json.dump(retired, f)
+        os.replace(f"{retired_path}.tmp", retired_path)
+        for path in dead:
+            os.remove(path)
+
+    def collect(self):
+        """Totals of every worker that has written a snapshot.
+
+        Every process writes a file of its own, named after its pid and
+        start time. Files of exited workers are folded into one instead of
+        deleted, so counters never go backwards when a worker restarts or a
+        pid is reused.
+        """
+        self.write()
+        totals = _empty_totals()
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            # workers scraping at once must not fold a file twice, or read
+            # it both before and after it was folded
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._retire()
+            for path in glob.glob(os.path.join(self.directory, "*.json")):
+                try:
+                    with open(path) as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                _merge(totals, snapshot)
+        return totals
+
+    def render(self):
+        """All workers' metrics in the Prometheus text format."""
+        totals = self.collect()
+        lines = [
+            "# HELP http_requests_total Requests by endpoint, method and status.",
+            "# TYPE http_requests_total counter"
+        ]
+        for key, value in sorted(totals["requests"].items()):
+            endpoint, method, status = key.split("|")
+            lines.append(f'http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {value}')
+
+        lines += [
+            "# HELP http_request_duration_seconds Request latency by endpoint and method.",
+            "# TYPE http_request_duration_seconds histogram"
+        ]
+        for key, histogram in sorted(totals["latency"].items()):
+            endpoint, method = key.split("|")
+            labels = f'endpoint="{endpoint}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {histogram["sum"]}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {histogram["count"]}')
+
+        lines += [
+            "# HELP db_queries_total Database queries run by requests, by endpoint.",
+            "# TYPE db_queries_total counter"
+        ]
+        for endpoint, value in sorted(totals["db_queries"].items()):
+            lines.append(f'db_queries_total{{endpoint="{endpoint}"}} {value}')
+
+        lines += [
+            "# HELP db_query_duration_seconds_total Time requests spent in database queries, by endpoint.",
+            "# TYPE db_query_duration_seconds_total counter"
+        ]
+        for endpoint, value in sorted(totals["db_time"].items()):
+            lines.append(f'db_query_duration_seconds_total{{endpoint="{endpoint}"}} {value}')
+
+        lines += [
+            "# HELP http_client_requests_total Calls to other services by host and outcome.",
+            "# TYPE http_client_requests_total counter"
+        ]
+        for key, call in sorted(totals["outbound"].items()):
+            host, outcome = key.split("|")
+            lines.append(f'http_client_requests_total{{host="{host}",outcome="{outcome}"}} {call["count"]}')
+
+        lines += [
+            "# HELP http_client_request_duration_seconds_total Time spent calling other services by host and outcome.",
+            "# TYPE http_client_request_duration_seconds_total counter"
+        ]
+        for key, call in sorted(totals["outbound"].items()):
+            host, outcome = key.split("|")
+            lines.append(f'http_client_request_duration_seconds_total{{host="{host}",outcome="{outcome}"}} {call["sum"]}')
+
+        lines += [
+            "# HELP log_records_dropped_total Log records dropped because the log queue was full.",
+            "# TYPE log_records_dropped_total counter",
+            f"log_records_dropped_total {totals['log_dropped']}"
+        ]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -3,10 +3,14 @@ import enum
 
 from flask import url_for
 import json
+from sqlalchemy.dialects.postgresql import TSVECTOR, insert
+from sqlalchemy.orm import aliased
 import pytz
 from pytz import timezone
 
 from . import db
+from .registry import NameRegistry
+from .vote_aggregator import vote_aggregator
 
 
 # get timezones
@@ -45,11 +49,17 @@ class Category(db.Model):
                 new_category = Category(name=c)
                 db.session.add(new_category)
         db.session.commit()
+        category_registry.invalidate()
 
 
 class Comment(db.Model):
     __tablename__ = "comments"
-    
+    __table_args__ = (
+        db.Index("ix_comments_post_id_created_time_id", "post_id", "created_time", "id"),
+        db.Index("ix_comments_author_post_id_created_time", "author", "post_id", "created_time"),
+        db.Index("ix_comments_author_created_time_id", "author", "created_time", "id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     author = db.Column(db.String(80), nullable=False)
     created_time = db.Column(db.DateTime, index=True, default=datetime.utcnow)
@@ -69,9 +79,39 @@ class Comment(db.Model):
         text = json_comment.get("text")
         return Comment(text=text)
 
+    @staticmethod
+    def latest_for(post_ids, limit):
+        """The ``limit`` newest comments of each post, keyed by post id.
+
+        One windowed query ranks the comments of every post in
+        ``ix_comments_post_id_created_time_id`` order, instead of a query
+        per post.
+        """
+        rank = db.func.row_number().over(
+            partition_by=Comment.post_id,
+            order_by=(Comment.created_time.desc(), Comment.id.desc())).label("rank")
+        ranked = db.session.query(Comment, rank) \
+            .filter(Comment.post_id.in_(post_ids)) \
+            .subquery()
+        latest = aliased(Comment, ranked)
+        comments = db.session.query(latest) \
+            .filter(ranked.c.rank <= limit) \
+            .order_by(ranked.c.post_id, ranked.c.rank) \
+            .all()
+        by_post = {id: [] for id in post_ids}
+        for comment in comments:
+            by_post[comment.post_id].append(comment)
+        return by_post
+
 
 class Post(db.Model):
     __tablename__ = "posts"
+    # ix_posts_title_trgm, the trigram index on f_unaccent(lower(title)) used
+    # by title suggestions, is an expression index managed by the migrations
+    __table_args__ = (
+        db.Index("ix_posts_created_time_id", "created_time", "id"),
+        db.Index("ix_posts_category_id_search_vector", "category_id", "search_vector", postgresql_using="gin"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     author = db.Column(db.String(100), nullable=False)
@@ -83,8 +123,16 @@ class Post(db.Model):
     end_date = db.Column(db.DateTime, nullable=False)
     description = db.Column(db.Text)
     created_time = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+    # bumped by every write to the post or its comments, used for HTTP validators
+    updated_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     category_id = db.Column(db.Integer, db.ForeignKey("categories.id"))
     votes = db.Column(db.Integer, default=0)
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # diacritic-folded title and description for full text search, see app/search.py
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(
+        "setweight(to_tsvector('simple', f_unaccent(coalesce(title, ''))), 'A') || "
+        "setweight(to_tsvector('simple', f_unaccent(coalesce(description, ''))), 'B')",
+        persisted=True)))
     category = db.relationship("Category", backref="posts")
     comments = db.relationship("Comment", backref="post", lazy="dynamic")
 
@@ -98,19 +146,68 @@ class Post(db.Model):
             "end_date": self.end_date,
             "created_time": self.created_time,
             "title": self.title,
-            "category": self.category.name,
+            "category": category_registry.name_for(self.category_id),
             "description": self.description,
-            "comment_count": self.comments.count(),
+            "comment_count": self.comment_count,
             "author": self.author,
             "image_url": self.image_url,
-            "votes": self.votes
+            # read-your-writes for votes this worker has not flushed yet
+            "votes": (self.votes or 0) + vote_aggregator.pending(self.id)
         }
 
+    @staticmethod
+    def bulk_to_json(posts):
+        """Serialize a page of posts without a query per post."""
+        return [post.to_json() for post in posts]
+
+    @staticmethod
+    def add_votes(id, delta):
+        """Atomically move the vote count of a post by ``delta``."""
+        Post.query.filter_by(id=id) \
+            .update({Post.votes: db.func.coalesce(Post.votes, 0) + delta}, synchronize_session=False)
+
+    @staticmethod
+    def reconcile_votes():
+        """Recount drifted vote counts from the votes table with one
+        set-based UPDATE. Corrected posts get a new ``updated_time`` so
+        their cached copies revalidate.
+
+        Returns the number of posts that were corrected.
+        """
+        result = db.session.execute("""
+            UPDATE posts SET votes = COALESCE(totals.votes, 0), updated_time = now() at time zone 'utc'
+            FROM posts AS p LEFT JOIN (
+                SELECT post_id, SUM(CASE WHEN vote_type = 'INCREMENT' THEN 1 ELSE -1 END) AS votes
+                FROM votes GROUP BY post_id
+            ) AS totals ON totals.post_id = p.id
+            WHERE posts.id = p.id AND posts.votes IS DISTINCT FROM COALESCE(totals.votes, 0)
+        """)
+        db.session.commit()
+        return result.rowcount
+
+    @staticmethod
+    def reconcile_comment_counts():
+        """Fix drifted comment counts with one set-based UPDATE. Corrected
+        posts get a new ``updated_time`` so their cached copies revalidate.
+
+        Returns the number of posts that were corrected.
+        """
+        result = db.session.execute("""
+            UPDATE posts SET comment_count = counts.count, updated_time = now() at time zone 'utc'
+            FROM (
+                SELECT posts.id, COUNT(comments.id) AS count
+                FROM posts LEFT JOIN comments ON comments.post_id = posts.id
+                GROUP BY posts.id
+            ) AS counts
+            WHERE posts.id = counts.id AND posts.comment_count <> counts.count
+        """)
+        db.session.commit()
+        return result.rowcount
+
     def update_from_json(self, json_put):
         self.title = json_put.get("title")
 
-        category = Category.query.filter_by(name=json_put.get("category")).first()
-        self.category_id = category.id
+        self.category_id = category_registry.id_for(json_put.get("category"))
         self.description = json_put.get("description")
 
         # convert to datetime objects
@@ -131,7 +228,6 @@ class Post(db.Model):
 
     @staticmethod
     def from_json(json_post):
-        category = Category.query.filter_by(name=json_post.get("category")).first()
 
         # convert to datetime objects
         start_date = datetime.strptime(json_post.get("start_date"), '%Y-%m-%d')
@@ -146,7 +242,7 @@ class Post(db.Model):
             start_date=utc_start_date.strftime('%Y-%m-%d'),
             end_date=utc_end_date.strftime('%Y-%m-%d'),
             title=json_post.get("title"),
-            category_id=category.id,
+            category_id=category_registry.id_for(json_post.get("category")),
             description=json_post.get("description"),
             url=json_post.get("url"),
             coupon_code=json_post.get("coupon"),
@@ -159,12 +255,21 @@ class VoteTypeEnum(enum.Enum):
     INCREMENT = "increment"
     DECREMENT = "decrement"
 
+    @property
+    def delta(self):
+        return 1 if self is VoteTypeEnum.INCREMENT else -1
+
 
 class Vote(db.Model):
     __tablename__ = "votes"
+    __table_args__ = (
+        db.UniqueConstraint("post_id", "voter", name="uq_votes_post_id_voter"),
+        db.Index("ix_votes_voter_post_id", "voter", "post_id"),
+        db.Index("ix_votes_post_id_created_time_id", "post_id", "created_time", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), index=True)
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"))
     voter = db.Column(db.String(100), nullable=False)
     vote_type = db.Column(db.Enum(VoteTypeEnum))
     created_time = db.Column(db.DateTime, default=datetime.utcnow)
@@ -178,6 +283,44 @@ class Vote(db.Model):
             "created_time": self.created_time
         }
 
+    @staticmethod
+    def cast(post_id, voter, vote_type):
+        """Record a vote unless the voter already voted on the post.
+
+        Relies on ``uq_votes_post_id_voter`` instead of a check-then-insert,
+        so concurrent votes cannot race. Returns the new vote id, or None
+        when the voter had already voted.
+        """
+        statement = insert(Vote.__table__) \
+            .values(post_id=post_id, voter=voter, vote_type=vote_type) \
+            .on_conflict_do_nothing(index_elements=["post_id", "voter"]) \
+            .returning(Vote.id)
+        return db.session.execute(statement).scalar()
+
+    @staticmethod
+    def revoke(vote_id, post_id, voter):
+        """Delete a vote owned by ``voter``, returning its type or None
+        when there was no such vote."""
+        statement = Vote.__table__.delete() \
+            .where(db.and_(Vote.id == vote_id, Vote.post_id == post_id, Vote.voter == voter)) \
+            .returning(Vote.vote_type)
+        return db.session.execute(statement).scalar()
+
+
+class VoteFlushMarker(db.Model):
+    """A post with votes a worker has not added to ``posts.votes`` yet,
+    written by ``VoteAggregator`` in the vote's transaction."""
+    __tablename__ = "vote_flush_markers"
+    __table_args__ = (
+        db.Index("ix_vote_flush_markers_created_time", "created_time"),
+        db.Index("ix_vote_flush_markers_post_id_created_time", "post_id", "created_time"),
+    )
+
+    worker = db.Column(db.String(100), primary_key=True)
+    generation = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    post_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    created_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 
 class Image(db.Model):
     __tablename__ = "images"
@@ -210,6 +353,7 @@ class Reason(db.Model):
                 new_reason = Reason(name=c)
                 db.session.add(new_reason)
         db.session.commit()
+        reason_registry.invalidate()
 
 
 class Report(db.Model):
@@ -226,9 +370,8 @@ class Report(db.Model):
 
     @staticmethod
     def from_json(json_report):
-        reason = Reason.query.filter_by(name=json_report.get("reason")).first()
         new_report = Report(
-            reason_id=reason.id,
+            reason_id=reason_registry.id_for(json_report.get("reason")),
             post_id=json_report.get("post_id"),
             comment_id=json_report.get("comment_id"),
             description=json_report.get("description")
@@ -238,8 +381,12 @@ class Report(db.Model):
     def to_json(self):
         return {
             "id": self.id,
-            "reason": self.reason.name,
+            "reason": reason_registry.name_for(self.reason_id),
             "description": self.description,
             "comment_id": self.comment_id,
             "post_id": self.post_id
-        }
\ No newline at end of file
+        }
+
+
+category_registry = NameRegistry(Category)
+reason_registry = NameRegistry(Reason)
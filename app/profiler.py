@@ -0,0 +1,187 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETER = re.compile(r"%\(\w+\)s|%s|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(statement):
+    """The statement with literals and parameters replaced by ``?`` and
+    lists of them folded, so the same query shape always reads the same."""
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _PARAMETER.sub("?", statement)
+    statement = _IN_LIST.sub("(...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def _explainable(statement):
+    statement = statement.lstrip().upper()
+    return statement.startswith("SELECT") and "FOR UPDATE" not in statement
+
+
+class SlowQueryProfiler:
+    """Keeps the slowest query shapes of a worker with their plans.
+
+    Cursor events time a ``SLOW_QUERY_SAMPLE_RATE`` share of statements.
+    One over ``SLOW_DB_QUERY_TIME`` is logged and added to a table of at
+    most ``SLOW_QUERY_TOP_N`` fingerprints, the one with the least total
+    time making room for a new one. The first time a SELECT shape is slow
+    a background thread runs ``EXPLAIN (ANALYZE, BUFFERS)`` on it over a
+    connection of its own. The table is written to ``SLOW_QUERY_DIR`` for
+    ``manage.py slow_queries`` at most every ``SLOW_QUERY_WRITE_INTERVAL``
+    seconds, and whenever a plan is captured.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._explaining = threading.BoundedSemaphore(2)
+        self._written_at = 0
+
+    def init_app(self, app):
+        self.threshold = app.config["SLOW_DB_QUERY_TIME"]
+        self.sample_rate = app.config["SLOW_QUERY_SAMPLE_RATE"]
+        self.top_n = app.config["SLOW_QUERY_TOP_N"]
+        self.explain = app.config["SLOW_QUERY_EXPLAIN"]
+        self.directory = app.config["SLOW_QUERY_DIR"]
+        self.write_interval = app.config["SLOW_QUERY_WRITE_INTERVAL"]
+        os.makedirs(self.directory, exist_ok=True)
+
+        # listening on the class does not create the engine, so its pool is
+        # only built once gevent has patched the process
+        event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(Engine, "handle_error", self._handle_error)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        sampled = random.random() < self.sample_rate
+        conn.info.setdefault("slow_query_start_time", []).append(
+            time.perf_counter() if sampled else None)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["slow_query_start_time"].pop()
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if elapsed >= self.threshold:
+            logger.warning(f"Slow query: {statement}, Parameters: {parameters}, Duration: {elapsed}")
+            self.record(conn.engine, statement, None if executemany else parameters, elapsed)
+
+    def _handle_error(self, context):
+        # a failed statement never reaches after_cursor_execute
+        if context.connection is not None and context.execution_context is not None:
+            starts = context.connection.info.get("slow_query_start_time")
+            if starts:
+                starts.pop()
+
+    def record(self, engine, statement, parameters, elapsed):
+        normalized = normalize(statement)
+        key = fingerprint(normalized)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if len(self.entries) >= self.top_n:
+                    cheapest = min(self.entries.values(), key=lambda e: e["total_time"])
+                    if cheapest["total_time"] > elapsed:
+                        return
+                    del self.entries[cheapest["fingerprint"]]
+                entry = self.entries[key] = {
+                    "fingerprint": key,
+                    "statement": normalized,
+                    "calls": 0,
+                    "total_time": 0.0,
+                    "max_time": 0.0,
+                    "plan": None
+                }
+            entry["calls"] += 1
+            entry["total_time"] += elapsed
+            entry["max_time"] = max(entry["max_time"], elapsed)
+            entry["last_seen"] = time.time()
+            capture = self.explain and entry["plan"] is None and parameters is not None \
+                and _explainable(statement) and self._explaining.acquire(blocking=False)
+        if capture:
+            worker = threading.Thread(
+                target=self._capture, args=(engine, entry, statement, parameters), daemon=True)
+            worker.start()
+        elif time.monotonic() - self._written_at >= self.write_interval:
+            self._write()
+
+    def _capture(self, engine, entry, statement, parameters):
+        try:
+            entry["plan"] = self._explain(engine, statement, parameters)
+        except Exception as e:
+            logger.error(f"Explaining slow query {entry['fingerprint']} failed: {e}")
+        finally:
+            self._explaining.release()
+        self._write()
+
+    def _explain(self, engine, statement, parameters):
+        # a raw DBAPI connection so the EXPLAIN is not profiled itself
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            return "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            connection.rollback()
+            connection.close()
+
+    def _write(self):
+        try:
+            self.write()
+        except OSError as e:
+            logger.error(f"Writing slow queries failed: {e}")
+
+    def write(self):
+        self._written_at = time.monotonic()
+        with self._lock:
+            entries = [dict(e) for e in self.entries.values()]
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(entries, f)
+        os.replace(f"{path}.tmp", path)
+
+    def top(self, limit):
+        """The slowest query shapes of all workers by total time."""
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path) as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for entry in entries:
+                total = merged.get(entry["fingerprint"])
+                if total is None:
+                    merged[entry["fingerprint"]] = entry
+                    continue
+                total["calls"] += entry["calls"]
+                total["total_time"] += entry["total_time"]
+                total["max_time"] = max(total["max_time"], entry["max_time"])
+                total["last_seen"] = max(total["last_seen"], entry["last_seen"])
+                total["plan"] = total["plan"] or entry["plan"]
+        return sorted(merged.values(), key=lambda e: e["total_time"], reverse=True)[:limit]
+
+
+slow_query_profiler = SlowQueryProfiler()
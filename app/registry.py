@@ -0,0 +1,72 @@
+import threading
+import time
+
+from flask import current_app
+
+from . import db
+
+
+class NameRegistry:
+    """Process-wide name <-> id map of a small reference table.
+
+    The table is read on first use and kept in memory. Every
+    ``REFERENCE_DATA_REFRESH_INTERVAL`` seconds the registry compares the
+    table's version, its row count and max id, with the loaded one and
+    reloads when it changed, so lookups and listings never query the table
+    in between.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.version = None
+        self._ids = {}
+        self._names = {}
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _table_version(self):
+        count, max_id = db.session.query(
+            db.func.count(self.model.id), db.func.max(self.model.id)).one()
+        return count, max_id
+
+    def load(self):
+        rows = db.session.query(self.model.id, self.model.name) \
+            .order_by(self.model.id) \
+            .all()
+        self._ids = {name: id for id, name in rows}
+        self._names = {id: name for id, name in rows}
+        self.version = (len(rows), rows[-1][0] if rows else None)
+        self._checked_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        interval = current_app.config["REFERENCE_DATA_REFRESH_INTERVAL"]
+        if self._checked_at is not None and time.monotonic() - self._checked_at < interval:
+            return
+        with self._lock:
+            if self._checked_at is not None and time.monotonic() - self._checked_at < interval:
+                return
+            if self.version is None or self._table_version() != self.version:
+                self.load()
+            else:
+                self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        self._checked_at = None
+        self.version = None
+
+    def id_for(self, name):
+        self._ensure_fresh()
+        return self._ids.get(name)
+
+    def name_for(self, id):
+        self._ensure_fresh()
+        return self._names.get(id)
+
+    def names(self):
+        self._ensure_fresh()
+        return list(self._names.values())
+
+    def etag(self):
+        self._ensure_fresh()
+        count, max_id = self.version
+        return f"{self.model.__tablename__}-{count}-{max_id}"
@@ -0,0 +1,87 @@
+import re
+
+from . import db
+from .cache import LRUCache
+from .models import Post, category_registry
+
+
+# recent prefixes are answered from memory while a user keeps typing
+suggestion_cache = LRUCache(maxsize=2048, ttl=60)
+
+
+def _tsquery(term):
+    # every word is matched as a prefix so partially typed words still hit,
+    # close to what the old substring search returned
+    words = re.findall(r"\w+", term)
+    if not words:
+        return None
+    return db.func.to_tsquery(
+        "simple", db.func.f_unaccent(" & ".join(f"{w}:*" for w in words)))
+
+
+class UnknownCategory(ValueError):
+    pass
+
+
+def filter_category(query, category):
+    """Limit a post query to a category, ``All`` or no category meaning
+    every post. Raises ``UnknownCategory`` for a name that does not exist,
+    which would otherwise compare ``category_id`` with NULL."""
+    if not category or category == "All":
+        return query
+    category_id = category_registry.id_for(category)
+    if category_id is None:
+        raise UnknownCategory(f"Unknown category: {category}")
+    return query.filter(Post.category_id == category_id)
+
+
+def search_query(query, term, category=None, engine="fulltext"):
+    """Apply a search term and category to a post query.
+
+    Returns the filtered query and the rank expression to order by, which
+    is ``None`` when the engine does not rank. The ``fulltext`` engine
+    matches against the diacritic-folded ``posts.search_vector`` so
+    "dien thoai" finds "điện thoại", and the category filter is answered
+    by the same GIN index. The ``ilike`` engine is the old substring scan
+    over titles.
+    """
+    query = filter_category(query, category)
+    if not term:
+        return query, None
+    if engine == "ilike":
+        return query.filter(Post.title.ilike(f"%{term}%")), None
+    tsquery = _tsquery(term)
+    if tsquery is None:
+        return query, None
+    query = query.filter(Post.search_vector.op("@@")(tsquery))
+    return query, db.func.ts_rank(Post.search_vector, tsquery).desc()
+
+
+def _normalize_prefix(prefix):
+    return " ".join(prefix.lower().split())
+
+
+def suggest_titles(prefix, limit):
+    """Return up to ``limit`` posts whose title contains ``prefix``.
+
+    Titles and prefix are compared diacritic-folded and lower cased so the
+    lookup is served by the ``ix_posts_title_trgm`` trigram index, best
+    matches first.
+    """
+    prefix = _normalize_prefix(prefix)
+    key = (prefix, limit)
+    suggestions = suggestion_cache.get(key)
+    if suggestions is not None:
+        return suggestions
+
+    folded_title = db.func.f_unaccent(db.func.lower(Post.title))
+    folded_prefix = db.func.f_unaccent(prefix)
+    pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    rows = db.session.query(Post.id, Post.title) \
+        .filter(folded_title.like(db.func.f_unaccent(f"%{pattern}%"), escape="\\")) \
+        .order_by(db.func.similarity(folded_title, folded_prefix).desc(), Post.votes.desc()) \
+        .limit(limit) \
+        .all()
+    suggestions = [{"id": id, "title": title} for id, title in rows]
+    suggestion_cache.set(key, suggestions)
+    return suggestions
@@ -0,0 +1,237 @@
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from . import db
+
+
+logger = logging.getLogger(__name__)
+
+
+class VoteAggregator:
+    """Write-behind vote counts for hot posts.
+
+    With ``VOTE_AGGREGATION`` on, every vote is still written to the
+    ``votes`` table in the request, but the change to ``posts.votes`` is
+    only added to a sharded in-memory counter. A background greenlet adds
+    the deltas of the touched posts every ``VOTE_FLUSH_INTERVAL_MS`` in one
+    UPDATE, whose cost does not depend on how many votes a post has, and a
+    last flush runs when the worker exits. Until a flush lands, ``pending``
+    gives the worker's own unflushed votes so readers see their writes.
+
+    The vote's transaction also writes a ``vote_flush_markers`` row for the
+    post, once per post and flush, which the flush that applies its delta
+    deletes. Markers older than ``VOTE_MARKER_STALE_AFTER`` seconds were
+    left by a worker that died before flushing, and every
+    ``VOTE_REPAIR_INTERVAL`` seconds the flusher recounts just their posts
+    from ``votes``.
+    """
+
+    def __init__(self, shards=16):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        for counters, _ in self._shards:
+            counters.clear()
+        self.worker = f"{socket.gethostname()}-{os.getpid()}-{time.time_ns()}"
+        self._generation = 0
+        # generation -> requests between begin and end
+        self._in_flight = {}
+        # posts with a marker in the current generation
+        self._marked = set()
+        # generations with markers the database still holds
+        self._marker_generations = set()
+
+    def _shard(self, post_id):
+        return self._shards[post_id % len(self._shards)]
+
+    def begin(self, post_id):
+        """Mark the post in the request's transaction before a vote is cast
+        or revoked, returns the generation to pass to ``add`` and ``end``."""
+        with self._lock:
+            generation = self._generation
+            self._in_flight[generation] = self._in_flight.get(generation, 0) + 1
+            marked = post_id in self._marked
+        if marked:
+            return generation
+        try:
+            db.session.execute("""
+                INSERT INTO vote_flush_markers (worker, generation, post_id, created_time)
+                VALUES (:worker, :generation, :post_id, :now)
+                ON CONFLICT DO NOTHING
+            """, {"worker": self.worker, "generation": generation, "post_id": post_id, "now": datetime.utcnow()})
+        except Exception:
+            self.end(generation)
+            raise
+        return generation
+
+    def add(self, post_id, delta, generation):
+        """Count a committed vote."""
+        counters, lock = self._shard(post_id)
+        with lock:
+            counters[post_id] = counters.get(post_id, 0) + delta
+        with self._lock:
+            if generation == self._generation:
+                self._marked.add(post_id)
+            self._marker_generations.add(generation)
+
+    def end(self, generation):
+        """Close a ``begin``, whether the vote was committed or not."""
+        with self._lock:
+            remaining = self._in_flight[generation] - 1
+            if remaining:
+                self._in_flight[generation] = remaining
+            else:
+                del self._in_flight[generation]
+
+    def pending(self, post_id):
+        counters, _ = self._shard(post_id)
+        return counters.get(post_id, 0)
+
+    def _snapshot(self):
+        snapshot = {}
+        for counters, lock in self._shards:
+            with lock:
+                snapshot.update(counters)
+        return snapshot
+
+    def _forget(self, snapshot):
+        for post_id, delta in snapshot.items():
+            counters, lock = self._shard(post_id)
+            with lock:
+                remaining = counters.get(post_id, 0) - delta
+                if remaining:
+                    counters[post_id] = remaining
+                else:
+                    counters.pop(post_id, None)
+
+    def flush(self):
+        """Add the pending deltas of every touched post to its vote count
+        in one UPDATE and drop the markers they cover, returns how many
+        posts were written."""
+        with self._flush_lock:
+            with self._lock:
+                generation = self._generation
+                self._generation += 1
+                self._marked = set()
+                # a request still in flight may add its delta after the
+                # snapshot, its generation's markers have to stay
+                keep_from = min(self._in_flight, default=generation + 1)
+                expired = {g for g in self._marker_generations if g < keep_from}
+            snapshot = self._snapshot()
+            deltas = sorted((post_id, delta) for post_id, delta in snapshot.items() if delta)
+            if not deltas and not expired:
+                self._forget(snapshot)
+                return 0
+            if deltas:
+                values = ", ".join(f"(:id{i}, :delta{i})" for i in range(len(deltas)))
+                params = {"now": datetime.utcnow()}
+                for i, (post_id, delta) in enumerate(deltas):
+                    params[f"id{i}"] = post_id
+                    params[f"delta{i}"] = delta
+                db.session.execute(f"""
+                    UPDATE posts SET updated_time = :now, votes = COALESCE(posts.votes, 0) + deltas.delta
+                    FROM (VALUES {values}) AS deltas (id, delta)
+                    WHERE posts.id = deltas.id
+                """, params)
+            if expired:
+                db.session.execute("""
+                    DELETE FROM vote_flush_markers
+                    WHERE worker = :worker AND generation < :keep_from
+                """, {"worker": self.worker, "keep_from": keep_from})
+            db.session.commit()
+            self._forget(snapshot)
+            with self._lock:
+                self._marker_generations -= expired
+            return len(deltas)
+
+    def repair(self, stale_after):
+        """Recount the posts of markers older than ``stale_after`` seconds
+        from ``votes`` and drop the markers, returns how many markers were
+        dropped.
+
+        Posts that also have a newer marker are left for later, a live
+        worker still has deltas for them that the recount would count
+        twice.
+        """
+        result = db.session.execute("""
+            WITH stale AS (
+                SELECT DISTINCT post_id FROM vote_flush_markers AS m
+                WHERE m.created_time < :cutoff AND NOT EXISTS (
+                    SELECT 1 FROM vote_flush_markers AS f
+                    WHERE f.post_id = m.post_id AND f.created_time >= :cutoff
+                )
+            ), recounted AS (
+                UPDATE posts SET updated_time = now() at time zone 'utc', votes = COALESCE((
+                    SELECT SUM(CASE WHEN vote_type = 'INCREMENT' THEN 1 ELSE -1 END)
+                    FROM votes WHERE votes.post_id = posts.id
+                ), 0)
+                FROM stale WHERE posts.id = stale.post_id
+            )
+            DELETE FROM vote_flush_markers
+            WHERE created_time < :cutoff AND post_id IN (SELECT post_id FROM stale)
+        """, {"cutoff": datetime.utcnow() - timedelta(seconds=stale_after)})
+        db.session.commit()
+        return result.rowcount
+
+    def start(self, app):
+        """Start the flusher of this worker process, once."""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # state inherited through fork belongs to the parent
+            self._reset()
+            self._pid = os.getpid()
+            flusher = threading.Thread(target=self._run, args=(app,), daemon=True)
+            flusher.start()
+            # gunicorn exits a worker it stops or recycles through sys.exit
+            atexit.register(self._flush_at_exit, app)
+
+    def _run(self, app):
+        interval = app.config["VOTE_FLUSH_INTERVAL_MS"] / 1000
+        repair_interval = app.config["VOTE_REPAIR_INTERVAL"]
+        repaired_at = time.monotonic()
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:
+                    # the counters are kept, the next flush retries them
+                    logger.error(f"Vote flush failed: {e}")
+                    db.session.rollback()
+                if time.monotonic() - repaired_at >= repair_interval:
+                    repaired_at = time.monotonic()
+                    try:
+                        self.repair(app.config["VOTE_MARKER_STALE_AFTER"])
+                    except Exception as e:
+                        logger.error(f"Vote repair failed: {e}")
+                        db.session.rollback()
+                db.session.remove()
+
+    def _flush_at_exit(self, app):
+        if self._pid != os.getpid():
+            return
+        with app.app_context():
+            try:
+                flushed = self.flush()
+                logger.info(f"Flushed vote counts of {flushed} posts on exit")
+            except Exception as e:
+                logger.error(f"Vote flush on exit failed: {e}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+
+vote_aggregator = VoteAggregator()
@@ -1,22 +1,84 @@
 import os
+import tempfile
 
 
 class Config:
     POSTS_PER_PAGE = 4
     INITIAL_COMMENTS_PER_POST = 2
+    COMMENTS_PER_PAGE = 50
     SLOW_DB_QUERY_TIME = 0.5
+    SLOW_QUERY_SAMPLE_RATE = 1.0
+    SLOW_QUERY_TOP_N = 50
+    SLOW_QUERY_EXPLAIN = True
+    SLOW_QUERY_DIR = os.environ.get("SLOW_QUERY_DIR", os.path.join(tempfile.gettempdir(), "giare-slow-queries"))
+    SLOW_QUERY_WRITE_INTERVAL = 5
+    SEARCH_ENGINE = "fulltext"
+    SUGGESTIONS_LIMIT = 8
+    SUGGESTIONS_MIN_PREFIX = 3
+    RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_REDIS_URL = os.environ.get("REDIS_URL")
+    RESPONSE_CACHE_INVALIDATION_FILE = os.environ.get(
+        "RESPONSE_CACHE_INVALIDATION_FILE", os.path.join(tempfile.gettempdir(), "giare-cache-invalidations"))
+    RESPONSE_CACHE_SIZE = 512
+    RESPONSE_CACHE_TTL = 30
+    RESPONSE_CACHE_MAX_PAGE = 3
+    REFERENCE_DATA_REFRESH_INTERVAL = 300
+    RESPONSE_ENCODER = "auto"
+    VOTE_AGGREGATION = os.environ.get("VOTE_AGGREGATION") == "true"
+    VOTE_FLUSH_INTERVAL_MS = 500
+    VOTE_REPAIR_INTERVAL = 60
+    VOTE_MARKER_STALE_AFTER = 600
+    MAX_VOTE_LOOKUP_IDS = 100
+    VOTES_PER_PAGE = 50
+    RECENT_VOTERS = 10
+    METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "giare-metrics"))
+    METRICS_WRITE_INTERVAL = 5
+    LOG_QUEUE_SIZE = 10000
+    ACCESS_LOG_SAMPLE_RATES = {
+        "main.index": 0.01,
+        "main.get_metrics": 0.01,
+        "api.get_posts": 0.1,
+        "api.get_post": 0.1,
+        "api.get_post_comments": 0.1,
+        "api.get_post_votes": 0.1,
+        "api.get_user_votes": 0.1
+    }
     MAX_CONTENT_LENGTH = 1024*1024
     UPLOAD_EXTENSIONS = ["jpg", "png", "jpeg"]
+    IMAGE_THUMBNAIL_SIZE = (500, 500)
+    IMAGE_WORKERS = 2
+    IMAGE_QUEUE_DEPTH = 8
+    IMAGE_TIMEOUT = 30
     AWS_REGION = "ap-southeast-2"
     AUTH0_API_AUDIENCE = "https://dev-d5keivxi.au.auth0.com/api/v2/"
     AUTH0_API_DOMAIN = "dev-d5keivxi.au.auth0.com"
     AUTH0_API_CLIENT_ID = "6dB5tu7LBweT0dVfBim26FxgA9hsYCMS"
     AUTH0_API_CLIENT_SECRET = os.environ.get("CLIENT_SECRET")
+    AUTH0_API_BASE_URL = os.environ.get("AUTH0_API_BASE_URL", f"https://{AUTH0_API_DOMAIN}/api/v2")
+    AUTH0_TOKEN_URL = os.environ.get("AUTH0_TOKEN_URL", f"https://{AUTH0_API_DOMAIN}/oauth/token")
+    AUTH0_TOKEN_REFRESH_AHEAD = 300
+    HTTP_POOL_HOSTS = 4
+    HTTP_POOL_SIZE = 50
+    HTTP_CONNECT_TIMEOUT = 3.05
+    HTTP_READ_TIMEOUT = 10
+    HTTP_MAX_RETRIES = 2
+    HTTP_RETRY_BACKOFF = 0.2
+    HTTP_BREAKER_THRESHOLD = 5
+    HTTP_BREAKER_RESET_TIMEOUT = 30
+    PROFILE_CACHE_SIZE = 10000
+    PROFILE_CACHE_TTL = 300
+    PROFILE_CACHE_STALE_TTL = 3600
+    PROFILE_CACHE_NEGATIVE_TTL = 60
+    PROFILE_CACHE_INVALIDATION_FILE = os.environ.get(
+        "PROFILE_CACHE_INVALIDATION_FILE", os.path.join(tempfile.gettempdir(), "giare-profile-invalidations"))
+    PROFILE_SEARCH_CHUNK = 25
+    MAX_PROFILE_LOOKUP_USERNAMES = 50
     SQLALCHEMY_DATABASE_URI = (
         f"postgresql://{os.environ.get('DATABASE_USERNAME')}:{os.environ.get('DATABASE_PASSWORD')}"
         f"@{os.environ.get('DATABASE_HOST')}:5432/{os.environ.get('DATABASE_NAME')}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_RECORD_QUERIES = False
 
     def init_app(self, app):
         import logging
@@ -63,6 +63,68 @@ def deploy():
     Reason.insert_reasons()
 
 
+@manager.command
+def reconcile():
+    """Fix drifted denormalized comment and vote counts on posts."""
+    fixed = Post.reconcile_comment_counts()
+    print(f"Reconciled comment counts of {fixed} posts")
+    fixed = Post.reconcile_votes()
+    print(f"Reconciled vote counts of {fixed} posts")
+
+
+@manager.command
+def export(output=None, category=None, start=None, end=None):
+    """Stream posts as newline-delimited JSON, optionally by category and
+    created date range (YYYY-MM-DD)."""
+    from app.export import export_query, iter_ndjson, parse_date
+    query = export_query(category, parse_date(start), parse_date(end))
+    out = open(output, "wb") if output else sys.stdout.buffer
+    try:
+        # Post.to_json builds urls, which needs a request context
+        with app.test_request_context():
+            for line in iter_ndjson(query):
+                out.write(line)
+    finally:
+        if output:
+            out.close()
+
+
+@manager.command
+def slow_queries(limit=10, plans=False):
+    """Show the slowest query shapes recorded by the workers."""
+    from datetime import datetime
+    from app.profiler import slow_query_profiler
+    for entry in slow_query_profiler.top(int(limit)):
+        last_seen = datetime.fromtimestamp(entry["last_seen"]).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{entry['fingerprint']}  calls: {entry['calls']}  total: {entry['total_time']:.3f}s  "
+              f"max: {entry['max_time']:.3f}s  last seen: {last_seen}")
+        print(f"    {entry['statement']}")
+        if plans and entry["plan"]:
+            print("\n".join(f"    | {line}" for line in entry["plan"].splitlines()))
+        print()
+
+
+@manager.command
+def bench_search(rows=100000, repeat=20, keep=False):
+    """Benchmark the ilike and full text search engines on seeded posts."""
+    from app.benchmarks import bench_search
+    bench_search(int(rows), int(repeat), app.config["POSTS_PER_PAGE"], keep=keep)
+
+
+@manager.command
+def bench_encoders(posts=50, repeat=2000):
+    """Benchmark the stdlib and orjson response encoders."""
+    from app.benchmarks import bench_encoders
+    bench_encoders(int(posts), int(repeat))
+
+
+@manager.command
+def bench_votes(voters=2000, concurrency=200):
+    """Benchmark concurrent votes on a single post."""
+    from app.benchmarks import bench_votes
+    bench_votes(app, int(voters), int(concurrency))
+
+
 @manager.command
 def profile(length=25, profile_dir=None):
     """Start the application under the code profiler."""
@@ -0,0 +1,41 @@
+"""added full text search for posts
+
+Revision ID: a7c3e91d5f02
+Revises: 8d4e2f6a7b13
+Create Date: 2026-10-18 11:26:50.902117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e91d5f02'
+down_revision = '8d4e2f6a7b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    # unaccent() is only STABLE, wrap it so it can be used in generated
+    # columns and index expressions
+    op.execute("""
+        CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS
+        $func$
+        SELECT public.unaccent('public.unaccent', $1)
+        $func$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """)
+    op.add_column('posts', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "setweight(to_tsvector('simple', f_unaccent(coalesce(title, ''))), 'A') || "
+        "setweight(to_tsvector('simple', f_unaccent(coalesce(description, ''))), 'B')",
+        persisted=True), nullable=True))
+    op.create_index('ix_posts_category_id_search_vector', 'posts', ['category_id', 'search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_posts_category_id_search_vector', table_name='posts')
+    op.drop_column('posts', 'search_vector')
+    op.execute("DROP FUNCTION IF EXISTS f_unaccent(text)")
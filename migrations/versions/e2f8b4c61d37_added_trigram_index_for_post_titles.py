@@ -0,0 +1,28 @@
+"""added trigram index for post titles
+
+Revision ID: e2f8b4c61d37
+Revises: a7c3e91d5f02
+Create Date: 2026-10-18 13:02:15.746330
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f8b4c61d37'
+down_revision = 'a7c3e91d5f02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX ix_posts_title_trgm ON posts "
+        "USING gin (f_unaccent(lower(title)) gin_trgm_ops)"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_posts_title_trgm', table_name='posts')
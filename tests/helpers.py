@@ -0,0 +1,21 @@
+import time
+
+
+class FakeClock:
+    """A clock for the ``clock`` argument of the classes under test that
+    only moves when a test sets ``now``."""
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for(condition, timeout=5):
+    """Wait for a background thread to make ``condition()`` true."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            raise AssertionError(f"Timed out after {timeout} seconds")
+        time.sleep(0.01)
@@ -0,0 +1,118 @@
+import threading
+import time
+import unittest
+
+import jwt
+import requests
+
+from app.api.auth import TokenManager
+
+from tests.helpers import FakeClock, wait_for
+
+
+def make_token(exp):
+    return jwt.encode({"exp": exp}, "secret", algorithm="HS256")
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class FakeAuth0:
+    """Token endpoint stand-in handing out the expiries it is given."""
+
+    def __init__(self, *expiries):
+        self.expiries = list(expiries)
+        self.calls = 0
+        self.called = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.error = None
+
+    def post(self, url, data=None, retry=None):
+        self.calls += 1
+        self.called.set()
+        self.release.wait()
+        if self.error:
+            raise self.error
+        return FakeResponse({"access_token": make_token(self.expiries.pop(0))})
+
+
+class TokenManagerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(100)
+
+    def manager(self, auth0):
+        return TokenManager(auth0, "https://auth0/oauth/token", {"client_id": "id"},
+                            refresh_ahead=300, clock=self.clock)
+
+    def test_cached_token(self):
+        auth0 = FakeAuth0(1000)
+        manager = self.manager(auth0)
+        token = manager.get()
+        self.assertEqual(manager.expires_at, 1000)
+        self.clock.now = 600
+        self.assertEqual(manager.get(), token)
+        self.assertEqual(auth0.calls, 1)
+
+    def test_single_flight(self):
+        auth0 = FakeAuth0(1000)
+        auth0.release.clear()
+        manager = self.manager(auth0)
+        tokens = []
+        callers = [threading.Thread(target=lambda: tokens.append(manager.get())) for _ in range(10)]
+        for caller in callers:
+            caller.start()
+        auth0.called.wait(5)
+        time.sleep(0.05)
+        auth0.release.set()
+        for caller in callers:
+            caller.join(5)
+        self.assertEqual(auth0.calls, 1)
+        self.assertEqual(len(tokens), 10)
+        self.assertEqual(len(set(tokens)), 1)
+
+    def test_refresh_ahead(self):
+        auth0 = FakeAuth0(1000, 2000)
+        manager = self.manager(auth0)
+        old = manager.get()
+
+        # inside the refresh window the current token is returned at once
+        auth0.release.clear()
+        self.clock.now = 800
+        self.assertEqual(manager.get(), old)
+        self.assertEqual(manager.get(), old)
+        auth0.release.set()
+        wait_for(lambda: manager.expires_at == 2000)
+        self.assertEqual(auth0.calls, 2)
+        self.assertNotEqual(manager.get(), old)
+
+    def test_failed_background_refresh_backs_off(self):
+        auth0 = FakeAuth0(1000)
+        manager = self.manager(auth0)
+        token = manager.get()
+        auth0.error = requests.ConnectionError("down")
+        self.clock.now = 800
+        self.assertEqual(manager.get(), token)
+        wait_for(lambda: manager._refresh is None and auth0.calls == 2)
+        self.assertEqual(manager.get(), token)
+        self.assertEqual(auth0.calls, 2)
+        self.clock.now = 811
+        manager.get()
+        wait_for(lambda: auth0.calls == 3)
+
+    def test_expired_token_raises_refresh_error(self):
+        auth0 = FakeAuth0(1000)
+        manager = self.manager(auth0)
+        manager.get()
+        auth0.error = requests.ConnectionError("down")
+        self.clock.now = 1000
+        with self.assertRaises(requests.ConnectionError):
+            manager.get()
@@ -0,0 +1,260 @@
+import fnmatch
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from app.cache import MemoryBackend, RedisBackend, RefreshingCache, TagClock
+
+from tests.helpers import FakeClock, wait_for
+
+
+class FakeRedis:
+    """Local stand-in for the part of the redis-py API RedisBackend uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+
+    def expire(self, key, ttl):
+        pass
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, pattern):
+        return [key for key in list(self.data) if fnmatch.fnmatch(key, pattern)]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        for name, args, kwargs in self.calls:
+            getattr(self.client, name)(*args, **kwargs)
+
+
+class RedisBackendTestCase(unittest.TestCase):
+    def setUp(self):
+        self.backend = RedisBackend(FakeRedis())
+
+    def test_get_set(self):
+        self.assertIsNone(self.backend.get("page"))
+        self.backend.set("page", b"body", 30, ["listing:All"], time.time_ns())
+        self.assertEqual(self.backend.get("page"), b"body")
+
+    def test_invalidate_drops_entries_under_the_tag(self):
+        self.backend.set("all", b"1", 30, ["listing:All", "post:1"], time.time_ns())
+        self.backend.set("food", b"2", 30, ["listing:Food", "post:2"], time.time_ns())
+        self.backend.invalidate(["post:1"])
+        self.assertIsNone(self.backend.get("all"))
+        self.assertEqual(self.backend.get("food"), b"2")
+
+    def test_write_during_render_is_not_cached(self):
+        since = time.time_ns()
+        self.backend.invalidate(["post:1"])
+        self.backend.set("page", b"stale", 30, ["listing:All", "post:1"], since)
+        self.assertIsNone(self.backend.get("page"))
+        self.backend.set("page", b"fresh", 30, ["listing:All", "post:1"], time.time_ns())
+        self.assertEqual(self.backend.get("page"), b"fresh")
+
+    def test_clear(self):
+        self.backend.set("page", b"body", 30, ["listing:All"], time.time_ns())
+        self.backend.invalidate(["post:1"])
+        self.backend.clear()
+        self.assertEqual(self.backend.client.data, {})
+
+
+class MemoryBackendTestCase(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        # two workers sharing the invalidation file
+        self.worker = MemoryBackend(16, TagClock(self.path, slots=1024))
+        self.other = MemoryBackend(16, TagClock(self.path, slots=1024))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_invalidation_reaches_other_workers(self):
+        self.worker.set("page", b"1", 30, ["listing:All", "post:1"], time.time_ns())
+        self.other.set("page", b"1", 30, ["listing:All", "post:1"], time.time_ns())
+        self.worker.invalidate(["post:1"])
+        self.assertIsNone(self.worker.get("page"))
+        self.assertIsNone(self.other.get("page"))
+
+    def test_untouched_tags_stay_cached(self):
+        self.other.set("page", b"1", 30, ["listing:Food", "post:2"], time.time_ns())
+        self.worker.invalidate(["post:1"])
+        self.assertEqual(self.other.get("page"), b"1")
+
+    def test_write_during_render_invalidates_the_page(self):
+        since = time.time_ns()
+        self.worker.invalidate(["post:1"])
+        self.other.set("page", b"stale", 30, ["post:1"], since)
+        self.assertIsNone(self.other.get("page"))
+
+
+class Loader:
+    """Records the keys it loads, ``release`` holds loads back."""
+
+    def __init__(self, values):
+        self.values = values
+        self.keys = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def load(self, key):
+        self.keys.append(key)
+        self.release.wait()
+        return self.values.get(key)
+
+    def load_many(self, keys):
+        self.keys.extend(keys)
+        self.release.wait()
+        return {key: self.values[key] for key in keys if key in self.values}
+
+
+class RefreshingCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(100)
+        self.cache = RefreshingCache(maxsize=4, ttl=10, stale_ttl=50, negative_ttl=5, clock=self.clock)
+        self.loader = Loader({"alice": "a1", "bob": "b1"})
+
+    def test_fresh_hit(self):
+        self.assertEqual(self.cache.get("alice", self.loader.load), "a1")
+        self.clock.now = 109
+        self.assertEqual(self.cache.get("alice", self.loader.load), "a1")
+        self.assertEqual(self.loader.keys, ["alice"])
+
+    def test_stale_value_is_served_while_reloading(self):
+        self.cache.get("alice", self.loader.load)
+        self.loader.values["alice"] = "a2"
+        self.loader.release.clear()
+        self.clock.now = 120
+        self.assertEqual(self.cache.get("alice", self.loader.load), "a1")
+        self.assertEqual(self.cache.get("alice", self.loader.load), "a1")
+        self.loader.release.set()
+        wait_for(lambda: not self.cache._loads)
+        self.assertEqual(self.loader.keys, ["alice", "alice"])
+        self.assertEqual(self.cache.get("alice", self.loader.load), "a2")
+        self.assertEqual(self.cache.stats()["stale_hits"], 2)
+
+    def test_expired_value_waits_for_the_load(self):
+        self.cache.get("alice", self.loader.load)
+        self.loader.values["alice"] = "a2"
+        self.clock.now = 161
+        self.assertEqual(self.cache.get("alice", self.loader.load), "a2")
+
+    def test_missing_key_is_cached_for_negative_ttl(self):
+        self.assertIsNone(self.cache.get("carol", self.loader.load))
+        self.loader.values["carol"] = "c1"
+        self.clock.now = 104
+        self.assertIsNone(self.cache.get("carol", self.loader.load))
+        self.assertEqual(self.loader.keys, ["carol"])
+        self.clock.now = 105
+        self.assertEqual(self.cache.get("carol", self.loader.load), "c1")
+
+    def test_failed_load_is_not_cached(self):
+        def fail(key):
+            raise ValueError("down")
+        with self.assertRaises(ValueError):
+            self.cache.get("alice", fail)
+        self.assertEqual(self.cache.get("alice", self.loader.load), "a1")
+
+    def test_concurrent_misses_share_one_load(self):
+        self.loader.release.clear()
+        values = []
+        callers = [
+            threading.Thread(target=lambda: values.append(self.cache.get("alice", self.loader.load)))
+            for _ in range(5)
+        ]
+        for caller in callers:
+            caller.start()
+        wait_for(lambda: self.loader.keys)
+        time.sleep(0.05)
+        self.loader.release.set()
+        for caller in callers:
+            caller.join(5)
+        self.assertEqual(self.loader.keys, ["alice"])
+        self.assertEqual(values, ["a1"] * 5)
+
+    def test_get_many_loads_misses_in_one_call(self):
+        self.cache.get("alice", self.loader.load)
+        values = self.cache.get_many(["alice", "bob", "carol"], self.loader.load_many)
+        self.assertEqual(values, {"alice": "a1", "bob": "b1", "carol": None})
+        self.assertEqual(self.loader.keys, ["alice", "bob", "carol"])
+
+    def test_get_many_waits_for_a_load_in_flight(self):
+        self.loader.release.clear()
+        single = threading.Thread(target=self.cache.get, args=("alice", self.loader.load))
+        single.start()
+        wait_for(lambda: self.loader.keys)
+        values = {}
+        many = threading.Thread(
+            target=lambda: values.update(self.cache.get_many(["alice", "bob"], self.loader.load_many)))
+        many.start()
+        wait_for(lambda: len(self.loader.keys) == 2)
+        self.loader.release.set()
+        single.join(5)
+        many.join(5)
+        self.assertEqual(self.loader.keys, ["alice", "bob"])
+        self.assertEqual(values, {"alice": "a1", "bob": "b1"})
+
+    def test_delete_reaches_other_workers(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        worker = RefreshingCache(ttl=10, clock=self.clock, invalidations=TagClock(path, slots=1024))
+        other = RefreshingCache(ttl=10, clock=self.clock, invalidations=TagClock(path, slots=1024))
+        self.assertEqual(worker.get("alice", self.loader.load), "a1")
+        self.assertEqual(other.get("alice", self.loader.load), "a1")
+        self.loader.values["alice"] = "a2"
+        worker.delete("alice")
+        self.assertEqual(other.get("alice", self.loader.load), "a2")
+        self.assertEqual(other.get("alice", self.loader.load), "a2")
+        self.assertEqual(self.loader.keys, ["alice", "alice", "alice"])
+
+    def test_load_started_before_a_delete_is_not_served(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        cache = RefreshingCache(ttl=10, clock=self.clock, invalidations=TagClock(path, slots=1024))
+        since = time.time_ns()
+        cache.delete("alice")
+        cache.set("alice", "stale", since)
+        self.assertEqual(cache.get("alice", self.loader.load), "a1")
+        self.assertEqual(self.loader.keys, ["alice"])
+
+    def test_least_recently_used_key_is_evicted(self):
+        for key in ("a", "b", "c", "d"):
+            self.cache.set(key, key)
+        self.cache.get("a", self.loader.load)
+        self.cache.set("e", "e")
+        self.assertEqual(self.cache.stats()["size"], 4)
+        self.assertIsNone(self.cache.get("b", self.loader.load))
+        self.assertEqual(self.loader.keys, ["b"])
@@ -0,0 +1,122 @@
+import unittest
+
+import requests
+
+from app.http_client import CircuitBreaker, CircuitOpenError, HttpClient
+
+from tests.helpers import FakeClock
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeSession:
+    """Answers with the given statuses, or raises them if exceptions."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(100)
+        self.breaker = CircuitBreaker(threshold=3, reset_timeout=30, clock=self.clock)
+
+    def open(self):
+        for _ in range(3):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(False)
+
+    def test_opens_after_threshold_failures(self):
+        self.breaker.record(False)
+        self.breaker.record(False)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False)
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_the_failure_count(self):
+        self.breaker.record(False)
+        self.breaker.record(False)
+        self.breaker.record(True)
+        self.breaker.record(False)
+        self.assertTrue(self.breaker.allow())
+
+    def test_half_open_lets_a_single_trial_through(self):
+        self.open()
+        self.clock.now = 129
+        self.assertFalse(self.breaker.allow())
+        self.clock.now = 130
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_trial_closes(self):
+        self.open()
+        self.clock.now = 130
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(True)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_opens_again(self):
+        self.open()
+        self.clock.now = 130
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False)
+        self.assertFalse(self.breaker.allow())
+        self.clock.now = 159
+        self.assertFalse(self.breaker.allow())
+        self.clock.now = 160
+        self.assertTrue(self.breaker.allow())
+
+
+class HttpClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(100)
+        self.client = HttpClient()
+        self.client.timeout = (1, 1)
+        self.client.max_retries = 2
+        self.client.backoff = 0
+        self.breaker = self.client.breakers["auth0"] = CircuitBreaker(
+            threshold=3, reset_timeout=30, clock=self.clock)
+
+    def test_retries_idempotent_calls(self):
+        self.client.session = FakeSession(requests.ConnectionError("reset"), 503, 200)
+        response = self.client.get("https://auth0/users")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.session.calls, 3)
+
+    def test_does_not_retry_posts(self):
+        self.client.session = FakeSession(requests.ConnectionError("reset"), 200)
+        with self.assertRaises(requests.ConnectionError):
+            self.client.post("https://auth0/users")
+        self.assertEqual(self.client.session.calls, 1)
+
+    def test_open_circuit_fails_fast(self):
+        self.client.session = FakeSession(500, 500, 500)
+        for _ in range(3):
+            self.client.post("https://auth0/users")
+        with self.assertRaises(CircuitOpenError):
+            self.client.post("https://auth0/users")
+        self.assertEqual(self.client.session.calls, 3)
+
+    def test_unexpected_error_ends_the_trial(self):
+        self.client.session = FakeSession(500, 500, 500, ValueError("bad header"), 200)
+        for _ in range(3):
+            self.client.post("https://auth0/users")
+        self.clock.now = 130
+        with self.assertRaises(ValueError):
+            self.client.get("https://auth0/users")
+        self.assertFalse(self.breaker._trial)
+        self.clock.now = 160
+        self.assertEqual(self.client.get("https://auth0/users").status_code, 200)
+        self.assertIsNone(self.breaker.opened_at)
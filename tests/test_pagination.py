@@ -0,0 +1,27 @@
+import base64
+import unittest
+from datetime import datetime
+
+from app.api.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+class CursorTestCase(unittest.TestCase):
+    def test_round_trip(self):
+        created_time = datetime(2021, 3, 1, 12, 30, 5, 123456)
+        cursor = encode_cursor(created_time, 42)
+        self.assertEqual(decode_cursor(cursor), (created_time, 42))
+
+    def test_cursor_is_url_safe(self):
+        cursor = encode_cursor(datetime(2021, 3, 1), 2 ** 40)
+        self.assertRegex(cursor, r"^[A-Za-z0-9_=-]+$")
+
+    def test_invalid_cursors(self):
+        for cursor in ["", "not a cursor", encode_cursor(datetime(2021, 3, 1), 1)[:-4] + "@@@@"]:
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_invalid_cursor_parts(self):
+        for raw in ["2021-03-01T00:00:00", "yesterday|1", "2021-03-01T00:00:00|one"]:
+            cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
@@ -0,0 +1,85 @@
+import unittest
+from unittest import mock
+
+from app.vote_aggregator import VoteAggregator
+
+
+class FakeSession:
+    """Records the statements the aggregator runs."""
+
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    def execute(self, statement, params=None):
+        self.statements.append((" ".join(str(statement).split()), params or {}))
+
+    def commit(self):
+        self.commits += 1
+
+    def inserted(self):
+        return [params["post_id"] for statement, params in self.statements if statement.startswith("INSERT")]
+
+    def deleted_before(self):
+        return [params["keep_from"] for statement, params in self.statements if statement.startswith("DELETE")]
+
+    def updated(self):
+        return [params for statement, params in self.statements if statement.startswith("UPDATE")]
+
+
+class VoteAggregatorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = FakeSession()
+        patcher = mock.patch("app.vote_aggregator.db", mock.Mock(session=self.session))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.aggregator = VoteAggregator()
+
+    def vote(self, post_id, delta):
+        generation = self.aggregator.begin(post_id)
+        self.aggregator.add(post_id, delta, generation)
+        self.aggregator.end(generation)
+
+    def test_marks_a_post_once_per_flush(self):
+        self.vote(1, 1)
+        self.vote(1, 1)
+        self.vote(2, -1)
+        self.assertEqual(self.session.inserted(), [1, 2])
+        self.assertEqual(self.aggregator.pending(1), 2)
+
+    def test_flush_applies_deltas_and_drops_their_markers(self):
+        self.vote(1, 1)
+        self.vote(2, -1)
+        self.assertEqual(self.aggregator.flush(), 2)
+        params = self.session.updated()[0]
+        self.assertEqual((params["id0"], params["delta0"], params["id1"], params["delta1"]), (1, 1, 2, -1))
+        self.assertEqual(self.session.deleted_before(), [1])
+        self.assertEqual(self.aggregator.pending(1), 0)
+
+        # the next vote on the post needs a new marker
+        self.vote(1, 1)
+        self.assertEqual(self.session.inserted(), [1, 2, 1])
+
+    def test_markers_of_requests_in_flight_are_kept(self):
+        self.vote(1, 1)
+        generation = self.aggregator.begin(2)
+        self.aggregator.flush()
+        # the vote on post 2 may still be added after the snapshot
+        self.assertEqual(self.session.deleted_before(), [])
+        self.aggregator.add(2, 1, generation)
+        self.aggregator.end(generation)
+        self.assertEqual(self.aggregator.flush(), 1)
+        self.assertEqual(self.session.deleted_before(), [2])
+
+    def test_rolled_back_vote_ends_without_a_count(self):
+        generation = self.aggregator.begin(1)
+        self.aggregator.end(generation)
+        self.assertEqual(self.aggregator.flush(), 0)
+        self.assertEqual(self.session.commits, 0)
+
+    def test_zero_deltas_are_not_written(self):
+        self.vote(1, 1)
+        self.vote(1, -1)
+        self.assertEqual(self.aggregator.flush(), 0)
+        self.assertEqual(self.session.updated(), [])
+        self.assertEqual(self.session.deleted_before(), [1])